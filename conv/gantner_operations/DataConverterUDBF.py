@@ -1,40 +1,111 @@
+from dataclasses import replace
 import datetime
 import logging
 import os
 from pathlib import Path
 import shutil
+import threading
+from typing import Callable, Optional
 
-import ginsapy.giutility.connect.PyQStationConnectWin as Qstation
-import matplotlib.dates as mpdt
 import numpy as np
 import pandas as pd
 from scipy.io import savemat
 
-from gantner_operations.GInsConnection import GInsConnection
+from gantner_operations.statistics import QC_COLUMNS, STAT_COLUMNS, channel_moments, channel_statistics, qc_excluded, qc_thresholds, windowed_statistics
 
 
 logger = logging.getLogger(__name__)
 
+UDBF_READER = os.getenv("UDBF_READER", "pool")  # pool | native | numpy
+
+OLE_EPOCH = np.datetime64("1899-12-30T00:00:00", "us") # (Object Linking and Embedding) 
+OLE_UNIX_EPOCH_DAYS = 25569.0 # 1970-01-01 as OLE date, also the matplotlib date epoch
+
+def ole_to_datetime64(oledt: np.ndarray) -> np.ndarray:
+    """
+    Vectorized OLE to datetime conversion.
+    Rounds to microseconds like datetime.timedelta(days=...) does.
+
+    Args:
+        oledt: Times in OLE days.
+
+    Returns:
+        np.ndarray: datetime64[ns] array.
+    """
+    us = np.rint(np.asarray(oledt, dtype=np.float64) * 86_400_000_000.0).astype(np.int64)
+    return (OLE_EPOCH + us.astype("timedelta64[us]")).astype("datetime64[ns]")
+
+# The Gantner library is not known to be thread safe, native decodes of concurrent pipeline workers are serialized.
+_NATIVE_LOCK = threading.Lock()
+
+def decode_udbf(path_udbf: str, on_chunk: Optional[Callable[[np.ndarray], None]] = None, with_metadata: bool = True) -> tuple[np.ndarray, list[str], float, list[str]]:
+    """
+    Decode a .dat file with the Gantner library.
+    Runs in the calling process, the reader pool calls it inside its worker processes.
+
+    Args:
+        path_udbf: Full path to the .dat file.
+        on_chunk: Called with every decoded buffer chunk (read only) while the file is read.
+        with_metadata: False skips the per channel name/unit and sample rate calls, they are returned as None.
+
+    Returns:
+        tuple: Matrix dat_file[row, column] with the OLE timestamp in column 0, channel names, sample rate, channel units.
+
+    Raises:
+        ValueError: Invalid channel count.
+    """
+    # Imported here, the numpy backend runs without the Gantner library installed.
+    import ginsapy.giutility.connect.PyQStationConnectWin as Qstation
+    from gantner_operations.GInsConnection import GInsConnection
+
+    with GInsConnection() as conn:
+        # Connect and extract file info.
+        conn.init_file(path_udbf)
+        channel_names, sample_rate, channel_unit = None, None, None
+        if with_metadata:
+            raw_num = conn.read_channel_count()
+            try:
+                channel_num = int(raw_num)
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid channel count from GInsConnection: {raw_num!r}")
+            channel_names = [conn.read_index_name(i).replace('-', '_') for i in range(channel_num)]
+            channel_unit = [conn.read_index_unit(i).strip() for i in range(channel_num)]
+            sample_rate = conn.read_sample_rate()
+        dat_file = Qstation.read_gins_dat(conn, on_chunk=on_chunk)
+    return dat_file, channel_names, sample_rate, channel_unit
+
 class DataConverterUDBF:
     """ 
     Supply utility to extract all information from a .dat file and convert it into an output file.
     """
-    def __init__(self, raw_file, path_dir, path_udbf, round_factor, index_timestamp=0):
+    def __init__(self, raw_file, path_dir, path_udbf, round_factor, index_timestamp=0, channels=None):
         self.raw_file = raw_file 
         self.path_dir = path_dir
         self.path_udbf = path_udbf
         self.data = None    
         self.df_stats = None
+        self.stats = {}
+        self.stats_channels = []
+        self.window_stats = None
+        self.spectral = {}
+        self.alarm_conditions = None
+        self.alarms = None
         self.index_timestamp = index_timestamp
         self.index_unit_time = None
-        self.date_strings = []
-        self.date_num = []
+        self._time_axis = None
+        self._df_time = None
         self.channel_names = None
         self.sample_rate = None
         self.channel_unit = []
         self.df = None
         self.time_relativ_vector = None
         self.round_factor = round_factor
+        self.udbf = None
+        self.layout = None
+        self.channels = frozenset(channels) if channels is not None else None
+        self.all_channel_names = None
+        self.all_channel_unit = []
+        self._full_data = None
 
     def check_filesize(self) -> int:
         """
@@ -84,6 +155,13 @@ class DataConverterUDBF:
     def read_udbf_file(self) -> bool:
         """
         Connect and extract info from .dat file.
+        With UDBF_READER=pool the Gantner library runs in an isolated reader process (see reader_pool),
+        with UDBF_READER=native it is called in this thread, with UDBF_READER=numpy the file is
+        parsed without the library and .udbf holds the zero-copy record view (see udbf_reader).
+        The header is fingerprinted first, if its layout is cached (see layout) the channel
+        metadata calls of the Gantner library are skipped and the cached names/units are used.
+        If .channels is set, .data and .channel_names only hold the timestamp and those channels,
+        the numpy reader then never converts the other columns (see full_data for archival exports).
 
         Returns:
             Bool: True, Fills .data parameter of classobject and creates a .time_relativ_vector.
@@ -93,39 +171,121 @@ class DataConverterUDBF:
             IOError: File could not be imported.
             Exception: File could not be imported.
         """
-        with GInsConnection() as conn:
-            # Connect and extract file info.
-            conn.init_file(self.path_udbf)
-            raw_num = conn.read_channel_count()
-            try:
-                self.channel_num = int(raw_num)
-            except (ValueError, TypeError):
-                raise ValueError(f"Invalid channel count from GInsConnection: {raw_num!r}")
-            channel_names = [conn.read_index_name(i).replace('-', '_') for i in range(self.channel_num)]
-            self.channel_names = channel_names    
-            self.sample_rate = conn.read_sample_rate()
-            self.channel_unit = conn.read_channels_unit()
-            # Import file info into numpy matrix, dat_file[row,column].
-            try:
-                dat_file=Qstation.read_gins_dat(conn)
-                self.data = dat_file
-            except IOError as e:
-                logger.warning(f"File {self.raw_file} could not be imported.")
-                raise e
-            except Exception as e:
-                logger.warning(f"File {self.raw_file} could not be imported.")
-                raise
-
-            # Construct a relativ time vector
-            time_abs_start = 0
-            time_step = 1/self.sample_rate
-            num_rows_dat_file = dat_file.shape[0]
-            time_end = num_rows_dat_file / self.sample_rate # In second
-            time_relativ_vector_row = np.arange(time_abs_start, time_end, time_step)
-            time_relativ_vector = time_relativ_vector_row.reshape(-1,1)
-            self.time_relativ_vector = time_relativ_vector
+        from gantner_operations.channel_selection import project_columns
+        from gantner_operations.layout import get_layout_cache, layout_from_header, read_header
+
+        cache = get_layout_cache()
+        try:
+            header = read_header(self.path_udbf)
+        except (ValueError, OSError) as e:
+            logger.debug(f"No header fingerprint for {self.raw_file}, layout cache bypassed: {e}")
+            header = None
+        layout = cache.get(layout_from_header(header).fingerprint) if header else None
+
+        full_data = None
+        try:
+            if UDBF_READER == "numpy":
+                from gantner_operations.udbf_reader import read_udbf
+                self.udbf = read_udbf(self.path_udbf)
+                layout = layout or layout_from_header(self.udbf.header)
+            else:
+                def decode(with_metadata: bool) -> tuple[np.ndarray, list[str], float, list[str]]:
+                    if UDBF_READER == "pool":
+                        from gantner_operations.reader_pool import get_reader_pool
+                        return get_reader_pool().read(self.path_udbf, with_metadata=with_metadata)
+                    with _NATIVE_LOCK:
+                        return decode_udbf(self.path_udbf, with_metadata=with_metadata)
+
+                full_data, channel_names, sample_rate, channel_unit = decode(layout is None)
+                if layout is not None and full_data.shape[1] != len(layout.channel_names):
+                    logger.warning(f"Cached layout does not fit {self.raw_file} ({full_data.shape[1]} columns), reading metadata.")
+                    layout = None
+                    full_data, channel_names, sample_rate, channel_unit = decode(True)
+                if layout is None and header is not None:
+                    layout = replace(layout_from_header(header), channel_names=channel_names, channel_units=channel_unit, sample_rate=sample_rate, stat_keys={})
+        except ValueError:
+            raise
+        except IOError as e:
+            logger.warning(f"File {self.raw_file} could not be imported.")
+            raise e
+        except Exception as e:
+            logger.warning(f"File {self.raw_file} could not be imported.")
+            raise
+
+        if layout is not None:
+            layout = cache.put(layout)
+            cache.observe(self.path_dir, layout)
+            self.all_channel_names, self.all_channel_unit = layout.channel_names, layout.channel_units
+            self.layout = layout.project(self.channels)
+            channel_names, sample_rate, channel_unit = self.layout.channel_names, self.layout.sample_rate, self.layout.channel_units
+            columns = self.layout.columns
+        else:
+            self.all_channel_names, self.all_channel_unit = channel_names, channel_unit
+            columns = project_columns(channel_names, self.channels) if self.channels is not None else None
+            if columns is not None:
+                channel_names = [channel_names[i] for i in columns]
+                channel_unit = [channel_unit[i] for i in columns] if channel_unit else channel_unit
+
+        # Only the selected channels become float64 columns, the full matrix stays available for archival exports.
+        if self.udbf is not None:
+            dat_file = self.udbf.to_matrix(columns)
+        elif columns is not None:
+            self._full_data = full_data
+            dat_file = full_data[:, columns]
+        else:
+            dat_file = full_data
+
+        self.channel_num = len(channel_names)
+        self.channel_names = channel_names
+        self.sample_rate = sample_rate
+        self.channel_unit = channel_unit
+        # Import file info into numpy matrix, dat_file[row,column].
+        self.data = dat_file
+        self._time_axis = None
+        self._df_time = None
+
+        # Construct a relativ time vector
+        time_abs_start = 0
+        time_step = 1/self.sample_rate
+        num_rows_dat_file = dat_file.shape[0]
+        time_end = num_rows_dat_file / self.sample_rate # In second
+        time_relativ_vector_row = np.arange(time_abs_start, time_end, time_step)
+        time_relativ_vector = time_relativ_vector_row.reshape(-1,1)
+        self.time_relativ_vector = time_relativ_vector
         return True
 
+    def full_data(self) -> tuple[np.ndarray, list[str], list[str]]:
+        """
+        Matrix of all channels of the file regardless of the channel selection.
+
+        Returns:
+            tuple: Matrix dat_file[row, column], channel names, channel units.
+        """
+        if self.udbf is not None and len(self.channel_names) != len(self.all_channel_names):
+            return self.udbf.to_matrix(), self.all_channel_names, self.all_channel_unit
+        if self._full_data is not None:
+            return self._full_data, self.all_channel_names, self.all_channel_unit
+        return self.data, self.channel_names, self.channel_unit
+
+    def channel_matrix(self, names: list[str]) -> np.ndarray:
+        """
+        Columns of the named channels, also of channels outside the selection, without converting
+        the whole file (numpy reader) or copying more than the requested columns.
+
+        Args:
+            names: Channel names of the file.
+
+        Returns:
+            np.ndarray: Samples x len(names), float64.
+        """
+        position = {name: i for i, name in enumerate(self.channel_names)}
+        if all(name in position for name in names):
+            return self.data[:, [position[name] for name in names]]
+        columns = [self.all_channel_names.index(name) for name in names]
+        if self.udbf is not None:
+            return self.udbf.to_matrix(columns)
+        return self.full_data()[0][:, columns]
+
     def ole2datetime(self, oledt: int) -> datetime.datetime:
         """ 
         Helper method to convert OLE to datetime.
@@ -155,36 +315,63 @@ class DataConverterUDBF:
             dt = dt.replace(micorsecond=0)
         return dt
 
+    @property
+    def time_axis(self) -> np.ndarray:
+        """
+        Absolute time of every sample as datetime64[ns], converted from the OLE column on first access.
+        """
+        if self._time_axis is None:
+            self._time_axis = ole_to_datetime64(self.data[:, self.index_timestamp])
+        return self._time_axis
+
+    @property
+    def date_num(self) -> np.ndarray:
+        """Sample times as days since 1970-01-01 (matplotlib date numbers)."""
+        return self.data[:, self.index_timestamp] - OLE_UNIX_EPOCH_DAYS
+
+    @property
+    def date_strings(self) -> list[datetime.datetime]:
+        """Sample times as datetime objects, only for callers that really need Python objects."""
+        return self.time_axis.astype("datetime64[us]").tolist()
+
+    @property
+    def df_time(self) -> pd.DataFrame:
+        """
+        Time columns date in %Y-%m-%d, time in %H:%M:%S, milliseconds. Built on first access.
+        """
+        if self._df_time is None:
+            t = self.time_axis
+            t_sec = t.astype("datetime64[s]")
+            iso = np.datetime_as_string(t_sec, unit="s")  # YYYY-MM-DDTHH:MM:SS
+            chars = iso.view("U1").reshape(len(iso), -1)
+            self._df_time = pd.DataFrame({
+                'Datum': iso.astype("U10"),
+                'Uhrzeit': np.ascontiguousarray(chars[:, 11:19]).view("U8").ravel(),
+                'Millisekunden': ((t - t_sec) // np.timedelta64(1, "ms")).astype(np.int64),
+            })
+        return self._df_time
+
     def date_converter(self) -> bool:
         """ 
         Creates a nomalized and converted time columns from the .dat file.
         Columns are date in %Y-%m-%d, time in %H:%M:%S, milliseconds.
+        The columns are built lazily by .df_time, this only drops cached ones of a previous read.
 
         Returns: 
-            Bool: True, Fills .df_time parameter
-        """
-        dat_file = self.data 
-        index_timestamp = 0
-        date_strings=[self.ole2datetime(oledt) for oledt in dat_file[:,index_timestamp]]
-        date_num=mpdt.date2num(date_strings)
-        date_strings = [self.normalize_datetime(dt) for dt in date_strings]
-        self.date_strings = date_strings
-        self.date_num = date_num
-        df_time = pd.DataFrame({'Datetime': date_strings})
-        df_time['Datum'] = df_time['Datetime'].dt.strftime('%Y-%m-%d')
-        df_time['Uhrzeit'] = df_time['Datetime'].dt.strftime('%H:%M:%S')
-        df_time['Millisekunden'] = df_time['Datetime'].dt.microsecond // 1000
-        df_time.drop(columns=['Datetime'], inplace=True)
-        self.df_time = df_time
+            Bool: True, .df_time is available
+        """
+        self._time_axis = None
+        self._df_time = None
         return True
 
-    def save_as_mat(self, output_dir: str) -> bool:
+    def save_as_mat(self, output_dir: str, full: bool = False) -> bool:
         """ 
         Converts info from .dat file into a .mat file.
         Contains relative_time, absolute_time, date, time, millisecond, values.
 
         Args:
             output_dir: Directory to save created file to.
+            full: Export all channels of the file instead of the selected ones.
         
         Returns:
             Bool: True, created a .mat file.
@@ -192,17 +379,18 @@ class DataConverterUDBF:
         mat_dict = {}
         name_of_mat = os.path.join(output_dir, self.raw_file.replace('.dat', '.mat'))
         try:
-            assert self.data.shape[1] == len(self.channel_names)
-            for idx, name in enumerate(self.channel_names):
+            data, channel_names, _ = self.full_data() if full else (self.data, self.channel_names, self.channel_unit)
+            assert data.shape[1] == len(channel_names)
+            for idx, name in enumerate(channel_names):
                 if idx == 0:
                     timestamp_data = {'relative_time': self.time_relativ_vector,
-                                      'absolut_time':self.data[:,idx].reshape(-1,1),
+                                      'absolut_time':data[:,idx].reshape(-1,1),
                                       'date':self.df_time['Datum'].values.astype('U'),
                                       'time':self.df_time['Uhrzeit'].values.astype('U'),
                                       'millisecond':self.df_time['Millisekunden'].values}
                     mat_dict[name] = timestamp_data
                 else:    
-                    mat_dict[name] = self.data[:,idx].reshape(-1,1)
+                    mat_dict[name] = data[:,idx].reshape(-1,1)
 
             savemat(name_of_mat, mat_dict)
             logger.debug(f"MAT file created: {name_of_mat}")
@@ -210,61 +398,226 @@ class DataConverterUDBF:
             logger.warning(f"Could not create a .mat file for {self.raw_file}: {e}")
         return True
     
-    def save_statistics_csv(self, finished_dir: str) -> bool:
+    def save_as_parquet(self, output_dir: str, full: bool = False) -> bool:
         """ 
-        Compute basic stats for each sensor channel and save them as a CSV.
-        Uses the channel_names and data to calculate the folling stats:
-        mean, median, min, max — all rounded by self.round_factor
+        Converts info from .dat file into a zstd compressed Parquet file.
+        Columns are timestamp (int64 ns since epoch, UTC as logged), relative_time and one float64 column per channel.
+        Units, sample rate and source file are stored in the schema metadata, units also per field.
+        Row groups hold PARQUET_ROW_GROUP_SEC seconds, so time range reads only touch the groups they need.
 
         Args:
-            finished_dir: Directory to save created file to.
+            output_dir: Directory to save created file to.
+            full: Export all channels of the file instead of the selected ones.
+        
+        Returns:
+            Bool: True, created a .parquet file.
+        """
+        import json
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        row_group_sec = float(os.getenv("PARQUET_ROW_GROUP_SEC", "10"))
+        zstd_level = int(os.getenv("PARQUET_ZSTD_LEVEL", "3"))
+
+        name_of_parquet = os.path.join(output_dir, self.raw_file.replace('.dat', '.parquet'))
+        tmp_path = name_of_parquet + ".tmp"
+        try:
+            data, channel_names, channel_unit = self.full_data() if full else (self.data, self.channel_names, self.channel_unit)
+            assert data.shape[1] == len(channel_names)
+            units = list(channel_unit) if channel_unit else [""] * len(channel_names)
+            fields = [
+                pa.field("timestamp", pa.int64(), nullable=False, metadata={"unit": "ns since 1970-01-01"}),
+                pa.field("relative_time", pa.float64(), nullable=False, metadata={"unit": "s"}),
+            ]
+            columns = [
+                pa.array(self.time_axis.astype(np.int64), type=pa.int64()),
+                pa.array(self.time_relativ_vector.ravel()[:data.shape[0]], type=pa.float64()),
+            ]
+            for idx, name in enumerate(channel_names):
+                if idx == self.index_timestamp:
+                    continue
+                fields.append(pa.field(name, pa.float64(), metadata={"unit": units[idx] or ""}))
+                columns.append(pa.array(data[:, idx], type=pa.float64()))
+
+            schema = pa.schema(fields, metadata={
+                "units": json.dumps({n: u for n, u in zip(channel_names, units)}),
+                "sample_rate": str(self.sample_rate),
+                "source_file": self.raw_file,
+            })
+            table = pa.Table.from_arrays(columns, schema=schema)
+            pq.write_table(
+                table, tmp_path,
+                compression="zstd", compression_level=zstd_level,
+                row_group_size=max(1, int(self.sample_rate * row_group_sec)),
+            )
+            os.replace(tmp_path, name_of_parquet)
+            logger.debug(f"Parquet file created: {name_of_parquet}")
+        except Exception as e:
+            logger.warning(f"Could not create a .parquet file for {self.raw_file}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return True
+
+    def skip_samples(self) -> int:
+        """
+        Number of leading samples excluded from the statistics.
+        Files not starting on a 10 minute boundary were cut by a restart of the system, their
+        first 10 seconds may contain 0's which would distort the statistics.
 
         Returns:
-            True: If CSV file was created
+            int: Samples to skip, 0 for aligned files.
         """
         import re
         from datetime import datetime
         LPI_PATTERN = re.compile(r'_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})')
 
-        try:
-            stats_rows = []
+        match = LPI_PATTERN.search(self.raw_file)
+        if match:
+            ts_str = match.group(1)  # e.g. "2025-06-19_12-20-00"
+            ts = datetime.strptime(ts_str, "%Y-%m-%d_%H-%M-%S")
+            aligned = (ts.minute % 10 == 0 and ts.second == 0)
+        else:
+            aligned = False
+        return 0 if aligned else int(self.sample_rate * 10)
 
-            match = LPI_PATTERN.search(self.raw_file)
-            if match:
-                ts_str = match.group(1)  # e.g. "2025-06-19_12-20-00"
-                ts = datetime.strptime(ts_str, "%Y-%m-%d_%H-%M-%S")
-                aligned = (ts.minute % 10 == 0 and ts.second == 0)
-            else:
-                aligned = False
+    def compute_statistics(self) -> pd.DataFrame:
+        """ 
+        Compute the stats of STAT_COLUMNS and the data quality checks of QC_COLUMNS for all sensor
+        channels in one vectorized call and fill .stats (stat -> array per channel), .stats_channels
+        and .df_stats. Channels of QC_EXCLUDE get qc 0 and no QC values, the others are checked against
+        their qc_thresholds.
+        All values are rounded by self.round_factor.
 
-            # Skip the first 10 seconds of the values to avoid including 0's, which may occur on restart of the system and distort the CSV.
-            skip = 0
-            if not aligned:
-                skip = int(self.sample_rate * 10)
+        Returns:
+            DataFrame: .df_stats, one row per sensor.
+        """
+        skip = self.skip_samples()
+        sensors = list(self.channel_names[1:])  # Skip index 0 (timestamp / OLE date)
+        if skip > 0 and self.data.shape[0] <= skip:
+            logger.warning(f"Not enough samples in {self.raw_file} to skip first 10s, dropping all channels.")
+            sensors = []
+
+        if sensors:
+            thresholds = qc_thresholds(sensors, self.sample_rate)
+            stats = channel_statistics(self.data[skip:, 1:], sample_rate=self.sample_rate, thresholds=thresholds)
+            stats = {k: np.round(v, self.round_factor) for k, v in stats.items()}
+            excluded = qc_excluded(sensors)
+            if excluded.any():
+                stats["qc"][excluded] = 0
+                for k in ("flatline_sec", "spike_ratio", "saturation"):
+                    stats[k][excluded] = np.nan
+        else:
+            stats = {k: np.empty(0) for k in (*STAT_COLUMNS, *QC_COLUMNS, "count")}
 
-            # Skip index 0 (timestamp / OLE date)
-            for idx, name in enumerate(self.channel_names):
-                if idx == 0:
-                    continue
-            
-                values = self.data[:, idx]
-                if skip > 0 and len(values) <= skip:
-                    logger.warning(f"Not enough samples in {name} to skip first 10s, dropping channel.")
-                    continue
-                trimmed = values[skip:] if skip > 0 else values
+        self.stats = stats
+        self.stats_channels = sensors
+        columns = {**STAT_COLUMNS, **QC_COLUMNS}
+        df_stats = pd.DataFrame({'Sensor': sensors, **{col: stats[k] for k, col in columns.items()}})
+        self.df_stats = df_stats
+        return df_stats
+
+    def compute_spectral(self) -> dict[str, np.ndarray]:
+        """
+        Welch PSD peaks and band powers (see spectral) of the channels matching SPECTRAL_CHANNELS,
+        over the same samples as compute_statistics. Skipped for slow loggers (SPECTRAL_MIN_RATE).
+
+        Returns:
+            dict: Stat -> one value per channel of .stats_channels, NaN for channels without spectrum.
+            Also stored in .spectral.
+        """
+        from gantner_operations.spectral import SPECTRAL_MIN_RATE, select_spectral_channels, spectral_features
+
+        if self.df_stats is None:
+            self.compute_statistics()
+        self.spectral = {}
+        selected = select_spectral_channels(self.stats_channels)
+        if not selected or self.sample_rate < SPECTRAL_MIN_RATE:
+            return self.spectral
+
+        skip = self.skip_samples()
+        features = spectral_features(self.data[skip:, 1:][:, selected], self.sample_rate)
+        for k, v in features.items():
+            column = np.full(len(self.stats_channels), np.nan)
+            column[selected] = v
+            self.spectral[k] = column
+        return self.spectral
+
+    def evaluate_alarms(self):
+        """
+        Evaluate the alarm rules (see alarms) on all samples of the matching channels, which are
+        read even if they are not part of the channel selection. The head of the file (first debounce
+        window, edges at the first sample) needs the previous file of the stream and is added by resolve_alarms.
+
+        Returns:
+            AlarmConditions: Also stored in .alarm_conditions.
+        """
+        from gantner_operations.alarms import conditions, get_alarm_engine
 
-                mean = round(np.mean(trimmed), self.round_factor)
-                vmin = round(np.min(trimmed), self.round_factor)
-                vmax = round(np.max(trimmed), self.round_factor)
+        engine = get_alarm_engine()
+        compiled = engine.compiled(self.all_channel_names or self.channel_names)
+        matrix = self.channel_matrix(compiled.columns) if compiled.columns else np.empty((self.data.shape[0], 0))
+        self.alarm_conditions = conditions(compiled, matrix, self.sample_rate)
+        return self.alarm_conditions
 
-                stats_rows.append({
-                    'Sensor':     name,
-                    'Mean':       mean,
-                    'Minimum':    vmin,
-                    'Maximum':    vmax
-                })
+    def resolve_alarms(self, source: str):
+        """
+        Complete .alarm_conditions with the head of the file against the previous file of the source.
+        Keeps per-source state, so files of one source have to be resolved in file order.
 
-            df_stats = pd.DataFrame(stats_rows)
+        Args:
+            source: Stream of the file, edges and debounce windows continue across the files of one source.
+
+        Returns:
+            AlarmResult: Also stored in .alarms.
+        """
+        from gantner_operations.alarms import get_alarm_engine
+
+        if self.alarm_conditions is None:
+            return None
+        self.alarms = get_alarm_engine().resolve(source, self.alarm_conditions)
+        return self.alarms
+
+    def stats_mapping(self) -> dict[str, float]:
+        """
+        Redis hash fields '<sensor>:<stat>' of the computed statistics, data quality checks, spectral features and alarm states.
+
+        Returns:
+            dict: Field -> value.
+        """
+        if self.df_stats is None:
+            self.compute_statistics()
+        cached = self.layout is not None and len(self.stats_channels) == len(self.layout.channel_names) - 1
+        mapping: dict[str, float] = {}
+        for k in STAT_COLUMNS:
+            keys = self.layout.stat_keys[k] if cached else [f"{sensor}:{k}" for sensor in self.stats_channels]
+            mapping.update(zip(keys, self.stats[k].tolist()))
+        for k in QC_COLUMNS:
+            if k in self.stats:
+                keys = self.layout.stat_keys[k] if cached else [f"{sensor}:{k}" for sensor in self.stats_channels]
+                mapping.update((key, v) for key, v in zip(keys, self.stats[k].tolist()) if v == v)  # excluded channels are NaN
+        for k, values in self.spectral.items():
+            mapping.update((f"{sensor}:{k}", v) for sensor, v in zip(self.stats_channels, values.tolist()) if v == v)
+        if self.alarms is not None:
+            mapping.update(self.alarms.fields(self.time_axis.astype("datetime64[ns]").astype(np.int64)))
+        return mapping
+
+    def save_statistics_csv(self, finished_dir: str) -> bool:
+        """ 
+        Compute basic stats for each sensor channel and save them as a CSV.
+        Uses the channel_names and data to calculate the stats of STAT_COLUMNS
+        (mean, min, max, std, rms, peak to peak, non-finite count) and the QC_COLUMNS checks,
+        all rounded by self.round_factor.
+
+        Args:
+            finished_dir: Directory to save created file to.
+
+        Returns:
+            True: If CSV file was created
+        """
+        try:
+            df_stats = self.df_stats if self.df_stats is not None else self.compute_statistics()
 
             # Determine output path
             stats_filename = self.raw_file.replace('.dat', '_stats.csv')
@@ -274,13 +627,74 @@ class DataConverterUDBF:
                 stats_path = stats_filename
 
             df_stats.to_csv(stats_path, index=False)
-            self.df_stats = df_stats
             logger.debug(f"Statistics CSV created: {stats_path}")
             return True
         except Exception as e:
             logger.warning(f"Couldn't write stats CSV for {self.raw_file}: {e}")  
             raise  
     
+    def compute_window_statistics(self, window_sec: float) -> dict[str, np.ndarray]:
+        """
+        Per-window statistics of all sensor channels as a columnar time series, so short
+        transients inside a file stay visible. Honours the same skip as compute_statistics.
+
+        Args:
+            window_sec: Window length in seconds.
+
+        Returns:
+            dict: 'time' (window start, int64 ns since epoch), 'channels' and one float32
+            array (windows x channels) per stat of WINDOW_STATS. Also stored in .window_stats.
+        """
+        skip = self.skip_samples()
+        values = self.data[skip:, 1:]
+        window = max(1, int(round(window_sec * self.sample_rate)))
+        starts, stats = windowed_statistics(values, window)
+        self.window_stats = {
+            "time": self.time_axis[skip:][starts].astype("datetime64[ns]").astype(np.int64),
+            "channels": np.array(self.channel_names[1:]),
+            "window_sec": np.float64(window / self.sample_rate),
+            **stats,
+        }
+        return self.window_stats
+
+    def save_window_statistics(self, output_dir: str) -> bool:
+        """ 
+        Save .window_stats as an uncompressed .npz (one array per column).
+
+        Args:
+            output_dir: Directory to save created file to.
+
+        Returns:
+            True: If the file was created.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, self.raw_file.replace('.dat', '_windows.npz'))
+        np.savez(path, **self.window_stats)
+        logger.debug(f"Window statistics created: {path}")
+        return True
+
+    def compute_moments(self) -> dict[str, np.ndarray]:
+        """
+        Mergeable count/mean/m2/min/max of all sensor channels for the roll-ups,
+        over the same samples as compute_statistics but without rounding.
+
+        Returns:
+            dict: Field of MOMENT_FIELDS -> one value per channel of .channel_names[1:].
+        """
+        return channel_moments(self.data[self.skip_samples():, 1:])
+
+    def envelope_buckets(self) -> dict[int, tuple[np.ndarray, ...]]:
+        """
+        Min/max/sum/count buckets of all sensor channels for every pyramid level, see gantner_operations.pyramid.
+        Unlike the statistics all samples are used, the envelope shows the file as recorded.
+
+        Returns:
+            dict: Level in seconds -> (t, min, max, sum, n).
+        """
+        from gantner_operations.pyramid import envelope_buckets
+
+        return envelope_buckets(self.time_axis.astype("datetime64[ns]").astype(np.int64), self.data[:, 1:])
+
     def move_to_finished(self, finished_dir: str) -> bool:
         """ 
         Move the original DAT file into a 'finished' directory.
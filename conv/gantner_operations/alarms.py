@@ -0,0 +1,305 @@
+from dataclasses import dataclass
+from fnmatch import fnmatch
+import json
+import logging
+import operator
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+ALARM_RULES_PATH = os.getenv("ALARM_RULES_PATH", "")  # JSON list of rules, empty uses DEFAULT_RULES
+
+# The alarm outputs of the Q.station are 0/1 channels, an alarm is raised while they are 1.
+DEFAULT_RULES = [
+    {"name": "gal", "pattern": "*_GAL", "op": "==", "threshold": 1},
+    {"name": "ral", "pattern": "*_RAL", "op": "==", "threshold": 1},
+]
+
+OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+EDGES = ("level", "rising", "falling")
+
+@dataclass(frozen=True)
+class AlarmRule:
+    """
+    One declarative rule: channels matching 'pattern' (glob, or a list of globs) are in alarm when
+    'value <op> threshold' holds for at least 'debounce_sec'. With edge 'rising' only the
+    transition into that state triggers, with 'falling' the transition out of it.
+    """
+    name: str
+    pattern: tuple[str, ...]
+    op: str
+    threshold: float
+    edge: str = "level"
+    debounce_sec: float = 0.0
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AlarmRule":
+        pattern = d["pattern"]
+        rule = cls(
+            name=d["name"],
+            pattern=(pattern,) if isinstance(pattern, str) else tuple(pattern),
+            op=d.get("op", ">="),
+            threshold=float(d["threshold"]),
+            edge=d.get("edge", "level"),
+            debounce_sec=float(d.get("debounce_sec", 0.0)),
+        )
+        if rule.op not in OPS:
+            raise ValueError(f"Alarm rule {rule.name!r}: unknown op {rule.op!r}")
+        if rule.edge not in EDGES:
+            raise ValueError(f"Alarm rule {rule.name!r}: unknown edge {rule.edge!r}")
+        return rule
+
+def load_rules(path: str = ALARM_RULES_PATH) -> list[AlarmRule]:
+    """
+    Rules from a JSON file (list of {name, pattern, op, threshold, edge, debounce_sec}) or DEFAULT_RULES.
+    """
+    if not path:
+        return [AlarmRule.from_dict(d) for d in DEFAULT_RULES]
+    with open(path) as f:
+        return [AlarmRule.from_dict(d) for d in json.load(f)]
+
+@dataclass
+class CompiledRules:
+    """
+    Rules resolved against one channel layout. Every (rule, channel) pair is one column of the
+    evaluation, pairs with the same op/edge/debounce are evaluated together on a column block.
+    """
+    channels: list[str]              # channel of every pair
+    rules: list[AlarmRule]           # rule of every pair
+    columns: list[str]               # distinct channels the pairs read, in matrix order
+    groups: list[tuple[AlarmRule, np.ndarray, np.ndarray, np.ndarray]]  # (template rule, pair idx, column idx, thresholds)
+
+def compile_rules(rules: list[AlarmRule], channel_names: list[str]) -> CompiledRules:
+    """Match the rule patterns against the channel names and group the pairs for evaluation."""
+    pair_channels: list[str] = []
+    pair_rules: list[AlarmRule] = []
+    for rule in rules:
+        for name in channel_names[1:]:
+            if any(fnmatch(name, p) for p in rule.pattern):
+                pair_channels.append(name)
+                pair_rules.append(rule)
+    columns = list(dict.fromkeys(pair_channels))
+    col_of = {name: i for i, name in enumerate(columns)}
+
+    grouped: dict[tuple, list[int]] = {}
+    for i, rule in enumerate(pair_rules):
+        grouped.setdefault((rule.op, rule.edge, rule.debounce_sec), []).append(i)
+    groups = []
+    for idx in grouped.values():
+        idx_arr = np.array(idx, dtype=np.intp)
+        groups.append((
+            pair_rules[idx[0]],
+            idx_arr,
+            np.array([col_of[pair_channels[i]] for i in idx], dtype=np.intp),
+            np.array([pair_rules[i].threshold for i in idx], dtype=np.float64),
+        ))
+    return CompiledRules(pair_channels, pair_rules, columns, groups)
+
+def _debounce(cond: np.ndarray, samples: int, run: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    True where the condition held for the last 'samples' samples (all columns at once).
+    'run' is the run length the condition ended the previous file with per column, a run
+    carrying over is continued instead of restarting at the first sample.
+    """
+    if samples <= 1:
+        return cond
+    if run is not None:
+        seed = np.minimum(run, samples - 1)[None, :] > np.arange(samples - 2, -1, -1)[:, None]
+        return _debounce(np.concatenate([seed, cond]), samples)[samples - 1:]
+    c = np.concatenate([np.zeros((1, cond.shape[1]), dtype=np.int64), np.cumsum(cond, axis=0, dtype=np.int64)])
+    held = np.zeros_like(cond)
+    if cond.shape[0] >= samples:
+        held[samples - 1:] = (c[samples:] - c[:-samples]) == samples
+    return held
+
+def _events(cond: np.ndarray, before: np.ndarray, edge: str) -> np.ndarray:
+    """Trigger samples of a debounced condition, 'before' is the debounced state of the sample preceding row 0."""
+    if edge == "level":
+        return cond
+    prev = np.concatenate([before[None, :], cond[:-1]])
+    return cond & ~prev if edge == "rising" else prev & ~cond
+
+@dataclass
+class AlarmResult:
+    channels: list[str]
+    rules: list[str]
+    active: np.ndarray        # bool per pair
+    first_index: np.ndarray   # sample index of the first trigger, -1 if none
+    triggers: np.ndarray      # number of trigger samples
+    last: np.ndarray          # debounced condition at the last sample, edge history for the next file
+    run: np.ndarray           # run length of the condition at the last sample, debounce history for the next file
+
+    def fields(self, time_ns: np.ndarray) -> dict[str, float]:
+        """Redis fields '<sensor>:alarm_<rule>' (0/1) and '<sensor>:alarm_<rule>_ts' (epoch seconds of the first trigger)."""
+        out: dict[str, float] = {}
+        for channel, rule, active, first in zip(self.channels, self.rules, self.active.tolist(), self.first_index.tolist()):
+            out[f"{channel}:alarm_{rule}"] = int(active)
+            if active:
+                out[f"{channel}:alarm_{rule}_ts"] = float(time_ns[first]) / 1e9
+        return out
+
+@dataclass
+class AlarmConditions:
+    """
+    Per-file part of the evaluation, independent of the previous file. Only the head of a file
+    (the first debounce window of a rule) depends on the state the previous file ended with, the
+    raw condition of the head is kept and resolve evaluates it against that state, so files can be
+    evaluated concurrently and resolved in file order.
+    """
+    channels: list[str]
+    rules: list[str]
+    samples: int              # rows of the file
+    heads: list[tuple[AlarmRule, np.ndarray, int, np.ndarray]]  # (template rule, pair idx, debounce samples, raw condition of the head rows)
+    active: np.ndarray        # bool per pair, triggers after the head only
+    first_index: np.ndarray
+    triggers: np.ndarray
+    last: np.ndarray          # debounced condition at the last sample, valid if the file is longer than the head
+    tail: np.ndarray          # trailing run length of the condition, == samples if it held in the whole file
+
+    def resolve(self, previous: Optional[np.ndarray] = None, run: Optional[np.ndarray] = None) -> AlarmResult:
+        """
+        Args:
+            previous: Debounced condition per pair at the end of the previous file (.last), all False if None.
+            run: Run length of the condition per pair at the end of the previous file (.run), all 0 if None.
+        """
+        n_pairs = len(self.channels)
+        if previous is None:
+            previous = np.zeros(n_pairs, dtype=bool)
+        if run is None:
+            run = np.zeros(n_pairs, dtype=np.int64)
+        if self.samples == 0:  # empty file, the state carries over
+            return AlarmResult(self.channels, self.rules, self.active, self.first_index, self.triggers, previous.copy(), run.copy())
+        active = self.active.copy()
+        first = self.first_index.copy()
+        triggers = self.triggers.copy()
+        last = self.last.copy()
+        for rule, pairs, samples, raw in self.heads:
+            held = _debounce(raw, samples, run[pairs])
+            events = _events(held, previous[pairs], rule.edge)
+            hit = events.any(axis=0)
+            first[pairs] = np.where(hit, events.argmax(axis=0), first[pairs])
+            active[pairs] |= hit
+            triggers[pairs] += events.sum(axis=0)
+            if raw.shape[0] == self.samples:
+                last[pairs] = held[-1]
+        carried = np.where(self.tail == self.samples, run + self.samples, self.tail)
+        return AlarmResult(self.channels, self.rules, active, first, triggers, last, carried)
+
+def conditions(compiled: CompiledRules, matrix: np.ndarray, sample_rate: float) -> AlarmConditions:
+    """
+    Evaluate all rules on the matrix of compiled.columns in one pass per rule group, except the
+    head of the file that depends on the previous file (see AlarmConditions.resolve).
+
+    Args:
+        compiled: Output of compile_rules.
+        matrix: Samples x len(compiled.columns).
+        sample_rate: Sample rate in Hz, converts debounce_sec into samples.
+    """
+    n = matrix.shape[0]
+    n_pairs = len(compiled.channels)
+    names = [r.name for r in compiled.rules]
+    active = np.zeros(n_pairs, dtype=bool)
+    first = np.full(n_pairs, -1, dtype=np.int64)
+    triggers = np.zeros(n_pairs, dtype=np.int64)
+    last = np.zeros(n_pairs, dtype=bool)
+    tail = np.zeros(n_pairs, dtype=np.int64)
+    heads = []
+    if n == 0:
+        return AlarmConditions(compiled.channels, names, 0, heads, active, first, triggers, last, tail)
+
+    rows = np.arange(n)[:, None]
+    for rule, pairs, cols, thresholds in compiled.groups:
+        with np.errstate(invalid="ignore"):
+            cond = OPS[rule.op](matrix[:, cols], thresholds[None, :])  # NaN never satisfies a condition
+        samples = max(1, int(np.ceil(rule.debounce_sec * sample_rate)))
+        # From row samples-1 on the debounced condition no longer depends on the previous file
+        h = min(samples, n)
+        heads.append((rule, pairs, samples, cond[:h].copy()))
+        tail[pairs] = n - 1 - np.where(cond, -1, rows).max(axis=0)
+        held = _debounce(cond, samples)
+        last[pairs] = held[-1]
+        if h < n:
+            events = _events(held[h:], held[h - 1], rule.edge)
+            hit = events.any(axis=0)
+            active[pairs] = hit
+            first[pairs] = np.where(hit, events.argmax(axis=0) + h, -1)
+            triggers[pairs] = events.sum(axis=0)
+    return AlarmConditions(compiled.channels, names, n, heads, active, first, triggers, last, tail)
+
+def evaluate(
+    compiled: CompiledRules,
+    matrix: np.ndarray,
+    sample_rate: float,
+    previous: Optional[np.ndarray] = None,
+    run: Optional[np.ndarray] = None,
+) -> AlarmResult:
+    """
+    Evaluate all rules on the matrix of compiled.columns, conditions and resolve in one call.
+
+    Args:
+        compiled: Output of compile_rules.
+        matrix: Samples x len(compiled.columns).
+        sample_rate: Sample rate in Hz, converts debounce_sec into samples.
+        previous: Debounced condition per pair at the end of the previous file (.last), edges
+            at the start of the file are detected against it. All False if None.
+        run: Run length of the condition per pair at the end of the previous file (.run),
+            debouncing continues it. All 0 if None.
+    """
+    return conditions(compiled, matrix, sample_rate).resolve(previous, run)
+
+class AlarmEngine:
+    """
+    Rules compiled once per channel layout, plus the condition state and run length at the end of
+    the last file of every source, so edges and debounce windows across file boundaries are detected.
+    """
+    def __init__(self, rules: Optional[list[AlarmRule]] = None) -> None:
+        self.rules = rules if rules is not None else load_rules()
+        self._compiled: dict[tuple[str, ...], CompiledRules] = {}
+        self._state: dict[str, dict[tuple[str, str], tuple[bool, int]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, source: str, cond: AlarmConditions) -> AlarmResult:
+        """
+        Edges of a file of one source (e.g. logger stream) against the last state of that source,
+        then remember its own last state. Call in file order (inside the commit turn).
+        """
+        pairs = list(zip(cond.channels, cond.rules))
+        with self._lock:
+            state = self._state.setdefault(source, {})
+            carried = [state.get(p, (False, 0)) for p in pairs]
+            previous = np.array([c[0] for c in carried], dtype=bool)
+            run = np.array([c[1] for c in carried], dtype=np.int64)
+            result = cond.resolve(previous, run)
+            state.update(zip(pairs, zip(result.last.tolist(), result.run.tolist())))
+        return result
+
+    def compiled(self, channel_names: list[str]) -> CompiledRules:
+        key = tuple(channel_names)
+        with self._lock:
+            if key not in self._compiled:
+                self._compiled[key] = compile_rules(self.rules, channel_names)
+                logger.debug(f"Compiled {len(self.rules)} alarm rules to {len(self._compiled[key].channels)} channel checks.")
+            return self._compiled[key]
+
+_engine: Optional[AlarmEngine] = None
+_engine_lock = threading.Lock()
+
+def get_alarm_engine() -> AlarmEngine:
+    """Process-wide engine with the rules of ALARM_RULES_PATH."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AlarmEngine()
+        return _engine
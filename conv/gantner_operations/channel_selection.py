@@ -0,0 +1,66 @@
+from functools import lru_cache
+import json
+import logging
+import os
+from typing import Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+LPI_CHANNELS = os.getenv("LPI_CHANNELS", "")  # comma separated channel names, overrides the mapping
+CHANNEL_MAPPING_PATH = os.getenv("CHANNEL_MAPPING_PATH", "")  # Modbus mapping.json, only its '<sensor>:<stat>' channels are computed
+EXPORT_FULL_CHANNELS = os.getenv("EXPORT_FULL_CHANNELS", "1") == "1"  # .mat/.parquet exports keep all channels
+
+def channels_from_mapping(mapping_path: str) -> frozenset[str]:
+    """
+    Sensors referenced by a Modbus mapping file ('<sensor>:<stat>' fields, health keys excluded).
+
+    Args:
+        mapping_path: Path to mapping.json, a list of {"field", "register"}.
+
+    Returns:
+        frozenset: Channel names.
+    """
+    with open(mapping_path) as f:
+        mapping = json.load(f)
+    return frozenset(
+        entry["field"].rsplit(":", 1)[0]
+        for entry in mapping
+        if ":" in entry["field"] and not entry["field"].startswith("health:")
+    )
+
+@lru_cache(maxsize=1)
+def selected_channels() -> Optional[frozenset[str]]:
+    """
+    Channels the consumers need, from LPI_CHANNELS or CHANNEL_MAPPING_PATH.
+
+    Returns:
+        frozenset | None: Channel names, None if nothing is configured (all channels).
+    """
+    if LPI_CHANNELS.strip():
+        return frozenset(c.strip() for c in LPI_CHANNELS.split(",") if c.strip())
+    if CHANNEL_MAPPING_PATH:
+        try:
+            channels = channels_from_mapping(CHANNEL_MAPPING_PATH)
+            logger.info(f"Channel projection: {len(channels)} channels from {CHANNEL_MAPPING_PATH}.")
+            return channels
+        except Exception:
+            logger.exception(f"Could not load channel mapping {CHANNEL_MAPPING_PATH}, using all channels.")
+    return None
+
+def project_columns(channel_names: list[str], wanted: Optional[Iterable[str]], index_timestamp: int = 0) -> list[int]:
+    """
+    Column indices of the wanted channels in file order, the timestamp column always first.
+
+    Args:
+        channel_names: All channel names of the file.
+        wanted: Channels to keep, None keeps all.
+        index_timestamp: Column of the timestamp.
+
+    Returns:
+        list: Column indices.
+    """
+    if wanted is None:
+        return list(range(len(channel_names)))
+    wanted = set(wanted)
+    return [index_timestamp] + [i for i, name in enumerate(channel_names) if i != index_timestamp and name in wanted]
@@ -0,0 +1,147 @@
+from dataclasses import dataclass, field
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from gantner_operations.channel_selection import project_columns
+from gantner_operations.statistics import QC_COLUMNS, STAT_COLUMNS
+from gantner_operations.udbf_reader import UDBFHeader, parse_header
+
+
+logger = logging.getLogger(__name__)
+
+HEADER_PROBE_BYTES = 64 * 1024
+
+@dataclass
+class ChannelLayout:
+    """
+    Everything about a file that only changes when the Q.station is reconfigured.
+    stat_keys holds the Redis fields per stat, in the order of channel_names[1:].
+    """
+    fingerprint: str
+    channel_names: list[str]
+    channel_units: list[str]
+    sample_rate: float
+    dtype: str
+    stat_keys: dict[str, list[str]] = field(default_factory=dict)
+    columns: Optional[list[int]] = None  # columns of the file layout, None for the file layout itself
+    _projections: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self.stat_keys:
+            sensors = self.channel_names[1:]
+            self.stat_keys = {k: [f"{sensor}:{k}" for sensor in sensors] for k in (*STAT_COLUMNS, *QC_COLUMNS)}
+
+    def project(self, wanted: Optional[frozenset[str]]) -> "ChannelLayout":
+        """
+        Layout restricted to the wanted channels (see channel_selection), memoized per selection.
+        .columns holds the column indices to decode, the timestamp column first.
+        """
+        if wanted is None:
+            return self
+        if wanted not in self._projections:
+            columns = project_columns(self.channel_names, wanted)
+            missing = sorted(wanted - set(self.channel_names))
+            if missing:
+                logger.info(f"Selected channels not in layout {self.fingerprint[:12]}: {missing}")
+            self._projections[wanted] = ChannelLayout(
+                fingerprint=self.fingerprint,
+                channel_names=[self.channel_names[i] for i in columns],
+                channel_units=[self.channel_units[i] for i in columns] if self.channel_units else [],
+                sample_rate=self.sample_rate,
+                dtype=self.dtype,
+                columns=columns,
+            )
+        return self._projections[wanted]
+
+def _fingerprint(header: UDBFHeader) -> str:
+    # Everything but the start time, which changes with every file.
+    parts = [
+        header.big_endian, header.version, header.vendor,
+        header.start_time_to_day_factor, header.act_time_data_type, header.act_time_to_second_factor,
+        header.sample_rate,
+        [(v.name, v.unit, v.data_type, v.direction, v.field_len, v.precision) for v in header.variables],
+    ]
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+def read_header(path_udbf: str) -> UDBFHeader:
+    """
+    Parse only the header of a .dat file, reading as few bytes as possible.
+
+    Raises:
+        ValueError: Not a UDBF file.
+    """
+    size = HEADER_PROBE_BYTES
+    with open(path_udbf, "rb") as f:
+        while True:
+            f.seek(0)
+            buf = f.read(size)
+            try:
+                return parse_header(buf)
+            except ValueError:
+                if len(buf) < size:
+                    raise
+                size *= 4
+
+def layout_from_header(header: UDBFHeader) -> ChannelLayout:
+    """Layout as the numpy reader sees it, names with '-' replaced like the Gantner path does."""
+    return ChannelLayout(
+        fingerprint=_fingerprint(header),
+        channel_names=[n.replace('-', '_') for n in header.channel_names],
+        channel_units=header.channel_units,
+        sample_rate=header.sample_rate,
+        dtype=header.record_dtype.str,
+    )
+
+class LayoutCache:
+    """
+    Layouts by header fingerprint, plus the last layout seen per source (input dir)
+    to report schema drift when a logger is reconfigured.
+    """
+    def __init__(self) -> None:
+        self._layouts: dict[str, ChannelLayout] = {}
+        self._current: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint: Optional[str]) -> Optional[ChannelLayout]:
+        if fingerprint is None:
+            return None
+        with self._lock:
+            return self._layouts.get(fingerprint)
+
+    def put(self, layout: ChannelLayout) -> ChannelLayout:
+        with self._lock:
+            return self._layouts.setdefault(layout.fingerprint, layout)
+
+    def observe(self, source: str, layout: ChannelLayout) -> bool:
+        """
+        Remember the layout of a source and log schema drift if it differs from the previous one.
+
+        Returns:
+            bool: True if the layout of the source changed.
+        """
+        with self._lock:
+            previous = self._current.get(source)
+            self._current[source] = layout.fingerprint
+            old = self._layouts.get(previous) if previous else None
+        if previous is None or previous == layout.fingerprint:
+            return False
+
+        if old is None:
+            logger.warning(f"Schema drift in {source}: layout changed to {layout.fingerprint[:12]}.")
+            return True
+        added = [n for n in layout.channel_names if n not in old.channel_names]
+        removed = [n for n in old.channel_names if n not in layout.channel_names]
+        logger.warning(
+            f"Schema drift in {source}: layout {previous[:12]} -> {layout.fingerprint[:12]}, "
+            f"channels {len(old.channel_names)} -> {len(layout.channel_names)}, added {added}, removed {removed}, "
+            f"sample rate {old.sample_rate} -> {layout.sample_rate}."
+        )
+        return True
+
+_cache = LayoutCache()
+
+def get_layout_cache() -> LayoutCache:
+    """Process-wide layout cache."""
+    return _cache
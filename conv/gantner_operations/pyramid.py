@@ -0,0 +1,217 @@
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_LEVELS_SEC = tuple(int(s) for s in os.getenv("PYRAMID_LEVELS_SEC", "1,10,60,600").split(","))
+
+NS_PER_SEC = 1_000_000_000
+_UNSAFE_CHARS = re.compile(r"[^\w.]")
+
+# One bucket of one channel. 't' is the bucket start in ns since epoch, 'sum'/'n' give the mean and merge exactly.
+BUCKET_DTYPE = np.dtype([
+    ("t", "<i8"),
+    ("min", "<f4"),
+    ("max", "<f4"),
+    ("sum", "<f8"),
+    ("n", "<i8"),
+])
+
+def _reduce_buckets(keys: np.ndarray, vmin: np.ndarray, vmax: np.ndarray, vsum: np.ndarray, n: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Combine consecutive rows with the same (sorted) key, all channels at once via reduceat.
+
+    Returns:
+        tuple: Unique keys, min, max, sum, n (buckets x channels).
+    """
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return (
+        keys[starts],
+        np.fmin.reduceat(vmin, starts, axis=0),
+        np.fmax.reduceat(vmax, starts, axis=0),
+        np.add.reduceat(vsum, starts, axis=0),
+        np.add.reduceat(n, starts, axis=0),
+    )
+
+def envelope_buckets(time_ns: np.ndarray, values: np.ndarray, levels_sec: tuple[int, ...] = PYRAMID_LEVELS_SEC) -> dict[int, tuple[np.ndarray, ...]]:
+    """
+    Bucket one file into all pyramid levels. The finest level is reduced from the samples,
+    every coarser level from the level below, so each sample is only touched once.
+    Non-finite samples are ignored (a bucket without finite samples has NaN min/max and n = 0).
+
+    Args:
+        time_ns: Sample timestamps, int64 ns since epoch, increasing.
+        values: Samples x channels, without the timestamp column.
+        levels_sec: Bucket widths in seconds, each a multiple of the previous one.
+
+    Returns:
+        dict: Level -> (t, min, max, sum, n), t has one entry per bucket, the others are buckets x channels.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(x)
+    out: dict[int, tuple[np.ndarray, ...]] = {}
+    if x.shape[0] == 0:
+        return out
+
+    level_ns = levels_sec[0] * NS_PER_SEC
+    out[levels_sec[0]] = _reduce_buckets(
+        (time_ns // level_ns) * level_ns,
+        np.where(finite, x, np.nan),
+        np.where(finite, x, np.nan),
+        np.where(finite, x, 0.0),
+        finite.astype(np.int64),
+    )
+    prev = out[levels_sec[0]]
+    for level in levels_sec[1:]:
+        level_ns = level * NS_PER_SEC
+        t, vmin, vmax, vsum, n = prev
+        prev = out[level] = _reduce_buckets((t // level_ns) * level_ns, vmin, vmax, vsum, n)
+    return out
+
+def _merge_records(records: np.ndarray) -> np.ndarray:
+    """Sort structured bucket records by time and merge duplicates."""
+    records = np.sort(records, order="t", kind="stable")
+    t, vmin, vmax, vsum, n = _reduce_buckets(
+        records["t"],
+        records["min"][:, None], records["max"][:, None],
+        records["sum"][:, None], records["n"][:, None],
+    )
+    out = np.empty(t.shape[0], dtype=BUCKET_DTYPE)
+    out["t"], out["min"], out["max"], out["sum"], out["n"] = t, vmin[:, 0], vmax[:, 0], vsum[:, 0], n[:, 0]
+    return out
+
+class EnvelopePyramid:
+    """
+    Min/max/mean envelope of every channel at several resolutions, stored as one flat
+    file of BUCKET_DTYPE records per channel and level: <root>/<level>s/<channel>.bin.
+    Files are append-only in the normal case (new file later than the last bucket),
+    only a file older than the stored data causes a rewrite of that channel/level.
+    Readers memory-map the files and never touch the raw .dat files.
+    """
+    def __init__(self, root: str | Path, levels_sec: tuple[int, ...] = PYRAMID_LEVELS_SEC) -> None:
+        self.root = Path(root)
+        self.levels_sec = tuple(sorted(levels_sec))
+        self._lock = threading.Lock()
+
+    def _path(self, level: int, channel: str) -> Path:
+        return self.root / f"{level}s" / f"{_UNSAFE_CHARS.sub('_', channel)}.bin"
+
+    def append(self, channels: list[str], buckets: dict[int, tuple[np.ndarray, ...]]) -> None:
+        """
+        Add the buckets of one file (see envelope_buckets). A bucket that continues the last
+        stored bucket (file boundary inside a bucket) is merged in place.
+
+        Args:
+            channels: Channel names, one per column of the bucket arrays.
+            buckets: Output of envelope_buckets.
+        """
+        with self._lock:
+            for level, (t, vmin, vmax, vsum, n) in buckets.items():
+                (self.root / f"{level}s").mkdir(parents=True, exist_ok=True)
+                for idx, channel in enumerate(channels):
+                    new = np.empty(t.shape[0], dtype=BUCKET_DTYPE)
+                    new["t"], new["min"], new["max"] = t, vmin[:, idx], vmax[:, idx]
+                    new["sum"], new["n"] = vsum[:, idx], n[:, idx]
+                    self._append_channel(self._path(level, channel), new)
+
+    def _append_channel(self, path: Path, new: np.ndarray) -> None:
+        size = path.stat().st_size if path.exists() else 0
+        count = size // BUCKET_DTYPE.itemsize
+        if count == 0:
+            with open(path, "wb") as f:
+                f.write(new.tobytes())
+            return
+
+        with open(path, "r+b") as f:
+            f.seek((count - 1) * BUCKET_DTYPE.itemsize)
+            last = np.frombuffer(f.read(BUCKET_DTYPE.itemsize), dtype=BUCKET_DTYPE)
+            if new["t"][0] > last["t"][0]:
+                f.seek(count * BUCKET_DTYPE.itemsize)
+                f.truncate()
+                f.write(new.tobytes())
+                return
+            if new["t"][0] == last["t"][0]:
+                merged = _merge_records(np.concatenate([last, new]))
+                f.seek((count - 1) * BUCKET_DTYPE.itemsize)
+                f.truncate()
+                f.write(merged.tobytes())
+                return
+
+        # Late file: merge into the stored series and replace the file atomically
+        logger.debug(f"Rewriting {path} for buckets older than the stored data.")
+        merged = _merge_records(np.concatenate([np.fromfile(path, dtype=BUCKET_DTYPE), new]))
+        tmp = path.with_suffix(".tmp")
+        merged.tofile(tmp)
+        os.replace(tmp, path)
+
+    def channels(self) -> list[str]:
+        """Channels stored at the finest level."""
+        level_dir = self.root / f"{self.levels_sec[0]}s"
+        return sorted(p.stem for p in level_dir.glob("*.bin")) if level_dir.is_dir() else []
+
+    def level_for(self, span_ns: int, pixels: int) -> int:
+        """Finest level that yields at most 'pixels' buckets for the span, the coarsest one otherwise."""
+        for level in self.levels_sec:
+            if span_ns / (level * NS_PER_SEC) <= pixels:
+                return level
+        return self.levels_sec[-1]
+
+    def load(self, level: int, channel: str) -> np.ndarray:
+        """Memory-mapped bucket records of one channel and level (empty if none stored)."""
+        path = self._path(level, channel)
+        if not path.exists() or path.stat().st_size < BUCKET_DTYPE.itemsize:
+            return np.empty(0, dtype=BUCKET_DTYPE)
+        count = path.stat().st_size // BUCKET_DTYPE.itemsize
+        return np.memmap(path, dtype=BUCKET_DTYPE, mode="r", shape=(count,))
+
+    def query(self, channel: str, start_ns: int, end_ns: int, pixels: int = 1000, level: Optional[int] = None) -> dict[str, np.ndarray]:
+        """
+        Envelope of a channel for [start_ns, end_ns) with at most 'pixels' points.
+        The level is chosen from the span, if it still yields more buckets than pixels
+        they are merged into 'pixels' equal groups.
+
+        Args:
+            channel: Channel name.
+            start_ns: Start, ns since epoch.
+            end_ns: End (exclusive), ns since epoch.
+            pixels: Maximum number of returned points.
+            level: Force a level in seconds instead of choosing one.
+
+        Returns:
+            dict: 't' (int64 ns), 'min', 'max', 'mean' (float64) and 'level' (seconds).
+        """
+        level = level or self.level_for(end_ns - start_ns, pixels)
+        records = self.load(level, channel)
+        lo, hi = np.searchsorted(records["t"], [start_ns, end_ns], side="left")
+        sel = np.asarray(records[lo:hi])
+        t = sel["t"]
+        vmin, vmax = sel["min"].astype(np.float64), sel["max"].astype(np.float64)
+        vsum, n = sel["sum"], sel["n"]
+
+        if pixels > 0 and t.shape[0] > pixels:
+            group = (np.arange(t.shape[0]) * pixels) // t.shape[0]
+            t, vmin, vmax, vsum, n = _reduce_buckets(group, vmin[:, None], vmax[:, None], vsum[:, None], n[:, None])
+            t = sel["t"][np.flatnonzero(np.r_[True, group[1:] != group[:-1]])]
+            vmin, vmax, vsum, n = vmin[:, 0], vmax[:, 0], vsum[:, 0], n[:, 0]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, vsum / np.maximum(n, 1), np.nan)
+        return {"t": t, "min": vmin, "max": vmax, "mean": mean, "level": np.int64(level)}
+
+_pyramids: dict[str, EnvelopePyramid] = {}
+_pyramids_lock = threading.Lock()
+
+def get_pyramid(root: str | Path) -> EnvelopePyramid:
+    """Process-wide pyramid per root directory, shared by the workers of a pipeline."""
+    key = str(root)
+    with _pyramids_lock:
+        if key not in _pyramids:
+            _pyramids[key] = EnvelopePyramid(root)
+        return _pyramids[key]
@@ -0,0 +1,185 @@
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import os
+from queue import Queue
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+READER_WORKERS = int(os.getenv("READER_WORKERS", str(min(4, os.cpu_count() or 1))))
+READER_TIMEOUT_SEC = float(os.getenv("READER_TIMEOUT_SEC", "120"))
+
+class ReaderCrashed(RuntimeError):
+    """The reader process died while decoding a file (e.g. segfault in the Gantner library)."""
+
+def _reader_main(conn: Connection) -> None:
+    """
+    Entry point of a reader process. Decodes one path per request and hands the matrix back
+    through a shared memory block, only the small metadata dict goes through the pipe.
+    The parent names the block, so it can unlink it when the reader dies or hangs before handing it over.
+    """
+    from gantner_operations.DataConverterUDBF import decode_udbf
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        path, with_metadata, shm_name = request
+        try:
+            data, channel_names, sample_rate, channel_unit = decode_udbf(path, with_metadata=with_metadata)
+            data = np.asarray(data, dtype=np.float64)
+            shm = shared_memory.SharedMemory(name=shm_name, create=True, size=max(data.nbytes, 1))
+            try:
+                np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+                conn.send({
+                    "shm": shm.name,
+                    "shape": data.shape,
+                    "dtype": data.dtype.str,
+                    "channel_names": channel_names,
+                    "sample_rate": sample_rate,
+                    "channel_unit": channel_unit,
+                })
+            finally:
+                shm.close()  # the parent unlinks the block after attaching
+        except Exception as e:
+            conn.send({"error": f"{type(e).__name__}: {e}"})
+
+def _unlink(shm_name: str) -> None:
+    """Remove the block of a request whose reader was killed, if the reader got as far as creating it."""
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+    logger.debug(f"Unlinked orphaned shared memory block {shm_name}.")
+
+class _ReaderSlot:
+    """
+    One reader process and its pipe. Restarted whenever the process dies or hangs.
+    """
+    def __init__(self, ctx: mp.context.BaseContext, idx: int) -> None:
+        self.ctx = ctx
+        self.idx = idx
+        self.process: Optional[mp.process.BaseProcess] = None
+        self.conn: Optional[Connection] = None
+        self._requests = 0
+        self.start()
+
+    def start(self) -> None:
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(target=_reader_main, args=(child_conn,), daemon=True, name=f"udbf_reader:{self.idx}")
+        process.start()
+        child_conn.close()
+        self.process, self.conn = process, parent_conn
+        logger.debug(f"Started UDBF reader process {process.name} (pid {process.pid}).")
+
+    def restart(self) -> None:
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.start()
+
+    def request(self, path: str, with_metadata: bool, timeout: float) -> dict:
+        if not self.process.is_alive():
+            logger.warning(f"UDBF reader {self.process.name} died while idle (exitcode {self.process.exitcode}), restarting.")
+            self.restart()
+
+        self._requests += 1
+        shm_name = f"udbf_{os.getpid()}_{self.idx}_{self._requests}"
+        self.conn.send((path, with_metadata, shm_name))
+        if not self.conn.poll(timeout):
+            logger.error(f"UDBF reader {self.process.name} timed out after {timeout}s on {path}, restarting.")
+            self.restart()
+            _unlink(shm_name)
+            raise TimeoutError(f"Reader timed out on {path}")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(timeout=5)
+            exitcode = self.process.exitcode
+            logger.error(f"UDBF reader {self.process.name} crashed on {path} (exitcode {exitcode}), restarting.")
+            self.restart()
+            _unlink(shm_name)
+            raise ReaderCrashed(f"Reader process crashed on {path} (exitcode {exitcode})")
+
+class UDBFReaderPool:
+    """
+    Pool of reader processes running the native Gantner decoder.
+    A crash of the library only kills one reader process, the file fails and the process is restarted.
+    Several pipeline workers can decode at the same time, one file per reader process.
+    """
+    def __init__(self, workers: int = READER_WORKERS, timeout: float = READER_TIMEOUT_SEC) -> None:
+        self.timeout = timeout
+        # spawn: forking a process with running watcher/worker threads is not safe
+        ctx = mp.get_context("spawn")
+        self._idle: Queue[_ReaderSlot] = Queue()
+        for i in range(max(1, workers)):
+            self._idle.put(_ReaderSlot(ctx, i))
+
+    def read(self, path_udbf: str, with_metadata: bool = True) -> tuple[np.ndarray, list[str], float, list[str]]:
+        """
+        Decode a file in one of the reader processes.
+
+        Args:
+            path_udbf: Full path to the .dat file.
+            with_metadata: False skips the channel name/unit/sample rate calls (layout cache hit).
+
+        Returns:
+            tuple: Same as decode_udbf.
+
+        Raises:
+            IOError: The library could not decode the file.
+            ReaderCrashed: The reader process died.
+            TimeoutError: The reader did not answer within the timeout.
+        """
+        slot = self._idle.get()
+        try:
+            msg = slot.request(path_udbf, with_metadata, self.timeout)
+        finally:
+            self._idle.put(slot)
+
+        if "error" in msg:
+            raise IOError(msg["error"])
+
+        shm = shared_memory.SharedMemory(name=msg["shm"])
+        try:
+            # One memcpy out of the block, so its lifetime does not depend on views held by later stages.
+            data = np.ndarray(msg["shape"], dtype=np.dtype(msg["dtype"]), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return data, msg["channel_names"], msg["sample_rate"], msg["channel_unit"]
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            slot = self._idle.get()
+            try:
+                slot.conn.send(None)
+                slot.process.join(timeout=5)
+            except Exception:
+                slot.process.kill()
+
+_pool: Optional[UDBFReaderPool] = None
+_pool_lock = threading.Lock()
+
+def get_reader_pool() -> UDBFReaderPool:
+    """Process-wide reader pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = UDBFReaderPool()
+        return _pool
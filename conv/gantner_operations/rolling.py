@@ -0,0 +1,206 @@
+from collections import deque
+import logging
+import math
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from gantner_operations.statistics import MOMENT_FIELDS
+
+
+logger = logging.getLogger(__name__)
+
+# Window name -> length in seconds, the name is the suffix of the Redis fields.
+ROLLING_WINDOWS = {
+    name: int(sec) for name, sec in
+    (w.split("=") for w in os.getenv("ROLLING_WINDOWS", "10min=600,1h=3600,24h=86400").split(","))
+}
+ROLLING_STATS = ("mean", "min", "max", "std", "count")
+
+class _ChannelWindow:
+    """
+    Sliding window over the aggregates of one channel. 'delta' and 'm2' are running totals of the
+    deviations and squared deviations of the samples from 'shift' (the first mean of the channel),
+    so the variance does not cancel at large offsets.
+    Min/max are monotonic deques (values increasing/decreasing from the front), so every push
+    and expiry is O(1) amortized.
+    """
+    __slots__ = ("entries", "shift", "count", "delta", "m2", "mins", "maxs")
+
+    def __init__(self) -> None:
+        self.entries: deque[tuple[int, float, float, float]] = deque()
+        self.shift: Optional[float] = None
+        self.count = 0.0
+        self.delta = 0.0
+        self.m2 = 0.0
+        self.mins: deque[tuple[int, float]] = deque()
+        self.maxs: deque[tuple[int, float]] = deque()
+
+    def push(self, t: int, count: float, mean: float, m2: float, vmin: float, vmax: float) -> None:
+        if count > 0 and self.shift is None:
+            self.shift = mean
+        d = mean - self.shift if count > 0 else 0.0
+        delta, m2 = count * d, m2 + count * d * d
+        self.entries.append((t, count, delta, m2))
+        self.count += count
+        self.delta += delta
+        self.m2 += m2
+        if not math.isnan(vmin):
+            while self.mins and self.mins[-1][1] >= vmin:
+                self.mins.pop()
+            self.mins.append((t, vmin))
+        if not math.isnan(vmax):
+            while self.maxs and self.maxs[-1][1] <= vmax:
+                self.maxs.pop()
+            self.maxs.append((t, vmax))
+
+    def expire(self, t_min: int) -> None:
+        while self.entries and self.entries[0][0] < t_min:
+            _, count, delta, m2 = self.entries.popleft()
+            self.count -= count
+            self.delta -= delta
+            self.m2 -= m2
+        while self.mins and self.mins[0][0] < t_min:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] < t_min:
+            self.maxs.popleft()
+        if not self.entries:
+            # no drift of the running totals once the window ran empty
+            self.count = self.delta = self.m2 = 0.0
+
+    def stats(self) -> dict[str, float]:
+        if self.count <= 0:
+            return {"mean": math.nan, "min": math.nan, "max": math.nan, "std": math.nan, "count": 0.0}
+        d = self.delta / self.count
+        return {
+            "mean": self.shift + d,
+            "min": self.mins[0][1] if self.mins else math.nan,
+            "max": self.maxs[0][1] if self.maxs else math.nan,
+            "std": math.sqrt(max(self.m2 / self.count - d * d, 0.0)),
+            "count": self.count,
+        }
+
+class RollingStats:
+    """
+    Live statistics of every channel over the last ROLLING_WINDOWS, fed with mergeable
+    aggregates (see statistics.channel_moments) per file or per second. Windows slide on the
+    data time (newest pushed timestamp), not the wall clock. An aggregate older than the newest
+    one is counted at the newest time, so late files never drop out of the windows early.
+    The aggregates of the longest window are the checkpoint, the deques are rebuilt from it.
+    """
+    def __init__(self, windows: dict[str, int] = ROLLING_WINDOWS, checkpoint_path: Optional[str | Path] = None) -> None:
+        self.windows = {name: sec * 1_000_000_000 for name, sec in windows.items()}
+        self.horizon = max(self.windows.values())
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.now = 0
+        self._state: dict[str, dict[str, _ChannelWindow]] = {name: {} for name in self.windows}
+        self._log: deque[tuple[int, list[str], dict[str, np.ndarray]]] = deque()
+        self._lock = threading.Lock()
+        self._last_checkpoint = time.monotonic()
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            try:
+                self._restore()
+            except Exception:
+                logger.exception(f"Could not restore rolling statistics from {self.checkpoint_path}, starting empty.")
+
+    def push(self, t_ns: int, channels: list[str], moments: dict[str, np.ndarray]) -> None:
+        """
+        Add the aggregates of one file (or one second) and slide all windows.
+
+        Args:
+            t_ns: Time of the aggregates, ns since epoch.
+            channels: Channel names.
+            moments: Field of MOMENT_FIELDS -> one value per channel.
+        """
+        with self._lock:
+            self._push(int(t_ns), channels, moments)
+
+    def _push(self, t: int, channels: list[str], moments: dict[str, np.ndarray]) -> None:
+        if t < self.now - self.horizon:
+            logger.debug(f"Dropping aggregates older than the longest window ({t}).")
+            return
+        t = max(t, self.now)
+        self.now = t
+        cols = [moments[k].tolist() for k in MOMENT_FIELDS]
+        for name, length in self.windows.items():
+            state = self._state[name]
+            for i, channel in enumerate(channels):
+                w = state.get(channel)
+                if w is None:
+                    w = state[channel] = _ChannelWindow()
+                w.push(t, cols[0][i], cols[1][i], cols[2][i], cols[3][i], cols[4][i])
+            for w in state.values():
+                w.expire(t - length + 1)
+
+        self._log.append((t, list(channels), {k: np.asarray(v, dtype=np.float64) for k, v in moments.items()}))
+        while self._log and self._log[0][0] <= t - self.horizon:
+            self._log.popleft()
+
+    def snapshot(self) -> dict[str, float]:
+        """
+        Redis fields '<sensor>:<stat>_<window>' of all channels and windows.
+        Channels without samples in a window are left out of it.
+        """
+        fields: dict[str, float] = {}
+        with self._lock:
+            for name, state in self._state.items():
+                for channel, w in state.items():
+                    if w.count > 0:
+                        fields.update({f"{channel}:{k}_{name}": v for k, v in w.stats().items()})
+        return fields
+
+    def checkpoint(self, min_interval_sec: float = 0.0) -> bool:
+        """
+        Write the aggregates of the longest window (npz, temp file + rename).
+
+        Args:
+            min_interval_sec: Skip if the last checkpoint is younger.
+
+        Returns:
+            bool: True if a checkpoint was written.
+        """
+        if self.checkpoint_path is None or time.monotonic() - self._last_checkpoint < min_interval_sec:
+            return False
+        with self._lock:
+            log = list(self._log)
+        counts = np.array([len(ch) for _, ch, _ in log], dtype=np.int64)
+        arrays = {
+            "t": np.array([t for t, _, _ in log], dtype=np.int64),
+            "n_channels": counts,
+            "channels": np.array([c for _, ch, _ in log for c in ch], dtype=str),
+        }
+        for k in MOMENT_FIELDS:
+            arrays[k] = np.concatenate([m[k] for _, _, m in log]) if log else np.empty(0)
+
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, self.checkpoint_path)
+        self._last_checkpoint = time.monotonic()
+        return True
+
+    def _restore(self) -> None:
+        with np.load(self.checkpoint_path) as cp:
+            offsets = np.concatenate([[0], np.cumsum(cp["n_channels"])])
+            channels = cp["channels"].tolist()
+            values = {k: cp[k] for k in MOMENT_FIELDS}
+            for i, t in enumerate(cp["t"].tolist()):
+                a, b = offsets[i], offsets[i + 1]
+                self._push(t, channels[a:b], {k: v[a:b] for k, v in values.items()})
+        logger.info(f"Restored {len(self._log)} aggregates of rolling statistics from {self.checkpoint_path}.")
+
+_engines: dict[str, RollingStats] = {}
+_engines_lock = threading.Lock()
+
+def get_rolling_stats(checkpoint_path: str | Path) -> RollingStats:
+    """Process-wide engine per checkpoint file."""
+    key = str(checkpoint_path)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = RollingStats(checkpoint_path=checkpoint_path)
+        return _engines[key]
@@ -0,0 +1,225 @@
+import logging
+import math
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import redis
+
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_REDIS_TTL = int(os.getenv("ROLLUP_REDIS_TTL", str(2 * 86400)))
+
+# Level name -> bucket width in seconds, each level is built from the one before.
+ROLLUP_LEVELS = {"10min": 600, "hour": 3600, "day": 86400}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contribution (
+    file TEXT NOT NULL, channel TEXT NOT NULL, bucket INTEGER NOT NULL,
+    count REAL NOT NULL, mean REAL NOT NULL, m2 REAL NOT NULL, min REAL, max REAL,
+    PRIMARY KEY (file, channel)
+);
+CREATE INDEX IF NOT EXISTS contribution_bucket ON contribution (bucket, channel);
+CREATE TABLE IF NOT EXISTS rollup (
+    level INTEGER NOT NULL, bucket INTEGER NOT NULL, channel TEXT NOT NULL,
+    count REAL NOT NULL, mean REAL NOT NULL, m2 REAL NOT NULL, min REAL, max REAL,
+    PRIMARY KEY (level, bucket, channel)
+);
+"""
+
+# Chan's merge of one contribution (the SET expressions all see the old row), NULL min/max (no finite samples) never wins.
+_MERGE = """
+INSERT INTO rollup (level, bucket, channel, count, mean, m2, min, max) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (level, bucket, channel) DO UPDATE SET
+    count = count + excluded.count,
+    mean = CASE WHEN count + excluded.count > 0
+        THEN mean + (excluded.mean - mean) * excluded.count / (count + excluded.count) ELSE mean END,
+    m2 = CASE WHEN count + excluded.count > 0
+        THEN m2 + excluded.m2 + (excluded.mean - mean) * (excluded.mean - mean) * count * excluded.count / (count + excluded.count)
+        ELSE m2 END,
+    min = MIN(COALESCE(min, excluded.min), COALESCE(excluded.min, min)),
+    max = MAX(COALESCE(max, excluded.max), COALESCE(excluded.max, max))
+"""
+
+# Merge of all children of a bucket per channel: count weighted mean, then the m2 of the children
+# plus their squared deviation from that mean. {source} selects the children.
+_REBUILD = """
+INSERT INTO rollup
+WITH children AS (SELECT channel, count, mean, m2, min, max FROM {source}),
+grouped AS (
+    SELECT channel, SUM(count) AS n, COALESCE(SUM(count * mean) / NULLIF(SUM(count), 0), 0) AS gm
+    FROM children GROUP BY channel
+)
+SELECT ?, ?, c.channel, g.n, g.gm, SUM(c.m2 + c.count * (c.mean - g.gm) * (c.mean - g.gm)), MIN(c.min), MAX(c.max)
+FROM children c JOIN grouped g ON g.channel = c.channel GROUP BY c.channel
+"""
+
+def _nullable(v: float) -> Optional[float]:
+    return None if math.isnan(v) else v
+
+class RollupStore:
+    """
+    Calendar roll-ups (10 min / hour / day) of count, mean, m2 (see channel_moments), min and max per channel
+    in a local SQLite file. Every file is stored as a contribution to its 10 minute bucket:
+    a new file (also a late one) is merged into all levels in O(channels), a reprocessed file
+    replaces its contribution and only the touched buckets are rebuilt from their children
+    (contributions -> 10 min -> hour -> day), never from raw data.
+    """
+    def __init__(self, path: str | Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add_file(self, file: str, file_time_ns: int, channels: list[str], moments: dict[str, np.ndarray]) -> list[tuple[int, int]]:
+        """
+        Add or replace the contribution of one file.
+
+        Args:
+            file: File name, identifies the contribution.
+            file_time_ns: Time of the first sample, ns since epoch, selects the buckets.
+            channels: Channel names.
+            moments: Output of channel_moments.
+
+        Returns:
+            list: Touched (level seconds, bucket start epoch seconds).
+        """
+        t = file_time_ns // 1_000_000_000
+        base = ROLLUP_LEVELS["10min"]
+        bucket = t - t % base
+        rows = [
+            (file, ch, bucket, float(moments["count"][i]), float(moments["mean"][i]), float(moments["m2"][i]),
+             _nullable(float(moments["min"][i])), _nullable(float(moments["max"][i])))
+            for i, ch in enumerate(channels)
+        ]
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                old_buckets = [b for (b,) in cur.execute("SELECT DISTINCT bucket FROM contribution WHERE file = ?", (file,))]
+                touched = {(level, t - t % level) for level in ROLLUP_LEVELS.values()}
+                if not old_buckets:
+                    cur.executemany("INSERT INTO contribution VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    for level in ROLLUP_LEVELS.values():
+                        b = t - t % level
+                        cur.executemany(_MERGE, [(level, b, ch, *r[3:]) for ch, r in zip(channels, rows)])
+                else:
+                    logger.info(f"Replacing roll-up contribution of reprocessed file {file}.")
+                    cur.execute("DELETE FROM contribution WHERE file = ?", (file,))
+                    cur.executemany("INSERT INTO contribution VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    for ob in old_buckets:
+                        touched |= {(level, ob - ob % level) for level in ROLLUP_LEVELS.values()}
+                    self._rebuild(cur, touched)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return sorted(touched)
+
+    def _rebuild(self, cur: sqlite3.Cursor, touched: set[tuple[int, int]]) -> None:
+        """Recompute the touched buckets from their children, finest level first."""
+        child_level = None
+        for level in ROLLUP_LEVELS.values():
+            for _, b in sorted(x for x in touched if x[0] == level):
+                cur.execute("DELETE FROM rollup WHERE level = ? AND bucket = ?", (level, b))
+                if child_level is None:
+                    source, args = "contribution WHERE bucket >= ? AND bucket < ?", (b, b + level)
+                else:
+                    source, args = "rollup WHERE level = ? AND bucket >= ? AND bucket < ?", (child_level, b, b + level)
+                cur.execute(_REBUILD.format(source=source), (*args, level, b))
+            child_level = level
+
+    def buckets(self, touched: list[tuple[int, int]]) -> dict[tuple[int, int], dict[str, float]]:
+        """
+        Current aggregates of buckets as Redis fields '<sensor>:<stat>' (count, mean, std, min, max).
+        """
+        out: dict[tuple[int, int], dict[str, float]] = {}
+        with self._lock:
+            for level, b in touched:
+                rows = self._db.execute(
+                    "SELECT channel, count, mean, m2, min, max FROM rollup WHERE level = ? AND bucket = ?", (level, b)
+                ).fetchall()
+                fields: dict[str, float] = {}
+                for channel, count, mean, m2, vmin, vmax in rows:
+                    mean, std = _mean_std(count, mean, m2)
+                    fields.update({
+                        f"{channel}:count": count,
+                        f"{channel}:mean": mean,
+                        f"{channel}:std": std,
+                        f"{channel}:min": vmin if vmin is not None else math.nan,
+                        f"{channel}:max": vmax if vmax is not None else math.nan,
+                    })
+                out[(level, b)] = fields
+        return out
+
+    def query(self, channel: str, level: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """
+        Roll-ups of one channel with start <= bucket < end.
+
+        Args:
+            channel: Channel name.
+            level: Key of ROLLUP_LEVELS.
+            start: Start (naive = UTC).
+            end: End (exclusive).
+
+        Returns:
+            DataFrame: bucket (UTC), count, mean, std, min, max.
+        """
+        with self._lock:
+            df = pd.read_sql_query(
+                "SELECT bucket, count, mean, m2, min, max FROM rollup WHERE level = ? AND channel = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                self._db,
+                params=(ROLLUP_LEVELS[level], channel, int(pd.Timestamp(start).timestamp()), int(pd.Timestamp(end).timestamp())),
+            )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["mean"] = df["mean"].where(df["count"] > 0)
+            df["std"] = np.sqrt(df["m2"] / df["count"])
+        df["bucket"] = pd.to_datetime(df["bucket"], unit="s")
+        return df[["bucket", "count", "mean", "std", "min", "max"]]
+
+    def publish(self, redis_db: redis.Redis, stream: str, touched: list[tuple[int, int]]) -> None:
+        """
+        Write touched buckets to 'rollup:<stream>:<level>:<bucket start epoch>'. The newest bucket
+        of a level is also written to 'rollup:<stream>:<level>', which the Modbus mapping can reference.
+        """
+        names = {v: k for k, v in ROLLUP_LEVELS.items()}
+        pipe = redis_db.pipeline()
+        for (level, b), fields in self.buckets(touched).items():
+            if not fields:
+                continue
+            key = f"rollup:{stream}:{names[level]}"
+            pipe.hset(f"{key}:{b}", mapping=fields)
+            pipe.expire(f"{key}:{b}", ROLLUP_REDIS_TTL)
+            if b >= self._latest(level):
+                pipe.delete(key)
+                pipe.hset(key, mapping={**fields, "bucket": b})
+                pipe.expire(key, ROLLUP_REDIS_TTL)
+        pipe.execute()
+
+    def _latest(self, level: int) -> int:
+        with self._lock:
+            (latest,) = self._db.execute("SELECT COALESCE(MAX(bucket), 0) FROM rollup WHERE level = ?", (level,)).fetchone()
+        return latest
+
+def _mean_std(count: float, mean: float, m2: float) -> tuple[float, float]:
+    if not count:
+        return math.nan, math.nan
+    return mean, math.sqrt(max(m2, 0.0) / count)
+
+_stores: dict[str, RollupStore] = {}
+_stores_lock = threading.Lock()
+
+def get_rollup_store(path: str | Path) -> RollupStore:
+    """Process-wide store per database file."""
+    key = str(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = RollupStore(path)
+        return _stores[key]
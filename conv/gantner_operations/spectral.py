@@ -0,0 +1,108 @@
+from fnmatch import fnmatch
+from functools import lru_cache
+import os
+
+import numpy as np
+from scipy import fft as sp_fft
+
+
+SPECTRAL_CHANNELS = [p.strip() for p in os.getenv("SPECTRAL_CHANNELS", "").split(",") if p.strip()]  # names or glob patterns, empty disables
+SPECTRAL_MIN_RATE = float(os.getenv("SPECTRAL_MIN_RATE", "10"))  # only files sampled at least this fast
+SPECTRAL_NPERSEG = int(os.getenv("SPECTRAL_NPERSEG", "1024"))
+SPECTRAL_PEAKS = int(os.getenv("SPECTRAL_PEAKS", "3"))
+SPECTRAL_FMIN = float(os.getenv("SPECTRAL_FMIN", "0.1"))  # peaks below (drift, DC) are ignored
+SPECTRAL_BANDS = [
+    tuple(float(f) for f in band.split("-"))
+    for band in os.getenv("SPECTRAL_BANDS", "0.1-1,1-5,5-20").split(",") if band.strip()
+]
+
+def spectral_fields(n_peaks: int = SPECTRAL_PEAKS, bands: list[tuple[float, float]] = SPECTRAL_BANDS) -> list[str]:
+    """Stat names of spectral_features, the Redis field is '<sensor>:<stat>'."""
+    fields = [f"peak{i + 1}_{k}" for i in range(n_peaks) for k in ("hz", "psd")]
+    return fields + [f"band_{lo:g}-{hi:g}" for lo, hi in bands]
+
+def select_spectral_channels(channel_names: list[str], patterns: list[str] = SPECTRAL_CHANNELS) -> list[int]:
+    """Indices into channel_names matching any of the patterns."""
+    return [i for i, name in enumerate(channel_names) if any(fnmatch(name, p) for p in patterns)]
+
+@lru_cache(maxsize=8)
+def _window(nperseg: int) -> tuple[np.ndarray, float]:
+    # Hann window and its power, shared by all files with the same segment length.
+    w = np.hanning(nperseg + 1)[:-1]  # periodic, as scipy.signal.get_window('hann')
+    w.setflags(write=False)
+    return w, float(np.sum(w * w))
+
+def welch_psd(values: np.ndarray, fs: float, nperseg: int = SPECTRAL_NPERSEG) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Welch PSD (Hann, 50 % overlap, mean detrend, density scaling like scipy.signal.welch) of all
+    channels with one batched rfft over every segment of every channel.
+
+    Args:
+        values: Samples x channels, finite.
+        fs: Sample rate in Hz.
+        nperseg: Segment length, shortened to the file length if needed.
+
+    Returns:
+        tuple: Frequencies (nfreq,), PSD (nfreq x channels).
+    """
+    x = np.asarray(values, dtype=np.float64)
+    nperseg = min(nperseg, x.shape[0])
+    step = max(1, nperseg // 2)
+    window, power = _window(nperseg)
+
+    segments = np.lib.stride_tricks.sliding_window_view(x, nperseg, axis=0)[::step]  # segments x channels x nperseg
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    spectrum = sp_fft.rfft(segments * window, axis=-1, workers=1)
+    psd = (spectrum.real ** 2 + spectrum.imag ** 2).mean(axis=0) / (fs * power)
+    if nperseg % 2:
+        psd[:, 1:] *= 2
+    else:
+        psd[:, 1:-1] *= 2
+    return sp_fft.rfftfreq(nperseg, 1 / fs), psd.T
+
+def spectral_features(
+    values: np.ndarray,
+    fs: float,
+    nperseg: int = SPECTRAL_NPERSEG,
+    n_peaks: int = SPECTRAL_PEAKS,
+    fmin: float = SPECTRAL_FMIN,
+    bands: list[tuple[float, float]] = SPECTRAL_BANDS,
+) -> dict[str, np.ndarray]:
+    """
+    Dominant frequencies (local maxima of the PSD above fmin, strongest first) and band powers
+    (PSD integrated over [lo, hi) Hz) of all channels. Non-finite samples are replaced by the channel mean.
+
+    Returns:
+        dict: Stat of spectral_fields -> float64 array with one value per channel, NaN if there is no such peak.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(x)
+    if not finite.all():
+        with np.errstate(invalid="ignore"):
+            fill = np.nanmean(np.where(finite, x, np.nan), axis=0)
+        x = np.where(finite, x, np.nan_to_num(fill))
+    freqs, psd = welch_psd(x, fs, nperseg)
+    n_ch = x.shape[1]
+    out: dict[str, np.ndarray] = {}
+
+    peak = np.zeros_like(psd, dtype=bool)
+    if psd.shape[0] > 2:
+        peak[1:-1] = (psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])
+    peak &= (freqs >= fmin)[:, None]
+    ranked = np.where(peak, psd, -np.inf)
+    order = np.argsort(-ranked, axis=0)[:n_peaks]
+    for i in range(n_peaks):
+        if i < order.shape[0]:
+            idx = order[i]
+            valid = np.isfinite(ranked[idx, np.arange(n_ch)])
+            out[f"peak{i + 1}_hz"] = np.where(valid, freqs[idx], np.nan)
+            out[f"peak{i + 1}_psd"] = np.where(valid, psd[idx, np.arange(n_ch)], np.nan)
+        else:
+            out[f"peak{i + 1}_hz"] = out[f"peak{i + 1}_psd"] = np.full(n_ch, np.nan)
+
+    df = freqs[1] - freqs[0] if freqs.shape[0] > 1 else 0.0
+    masks = np.array([(freqs >= lo) & (freqs < hi) for lo, hi in bands], dtype=np.float64).reshape(len(bands), -1)
+    band_power = masks @ psd * df
+    for (lo, hi), p in zip(bands, band_power):
+        out[f"band_{lo:g}-{hi:g}"] = p
+    return out
@@ -0,0 +1,185 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_THREADS = int(os.getenv("ANALYSIS_THREADS", str(min(4, os.cpu_count() or 1))))  # stages run at once, process-wide
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One analysis step of a file. fn is called with one keyword argument per input, the value of
+    a resource or the return value of a stage of the same graph.
+    A failing required stage fails the file, a failing optional stage is logged and its dependents are skipped.
+    """
+    name: str
+    fn: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    required: bool = False
+
+@dataclass
+class StageRun:
+    """Outcome of a stage: return value, wall time in seconds and the error, if any."""
+    value: Any = None
+    seconds: float = 0.0
+    error: Optional[BaseException] = None
+    skipped: bool = False
+
+@dataclass
+class GraphRun:
+    """Outcomes of all stages and the time spent materializing the resources."""
+    stages: dict[str, StageRun] = field(default_factory=dict)
+    resources: dict[str, float] = field(default_factory=dict)
+
+    def ok(self, name: str) -> bool:
+        run = self.stages.get(name)
+        return run is not None and run.error is None and not run.skipped
+
+    def value(self, name: str, default: Any = None) -> Any:
+        return self.stages[name].value if self.ok(name) else default
+
+    @property
+    def timings(self) -> dict[str, float]:
+        """Seconds per resource and stage, in completion order."""
+        return {**self.resources, **{k: v.seconds for k, v in self.stages.items() if not v.skipped}}
+
+class _Resource:
+    """Shared intermediate, built by the first stage needing it and then reused by all others. A failed build is not retried."""
+    def __init__(self, build: Callable[[], Any]) -> None:
+        self.build = build
+        self.lock = threading.Lock()
+        self.done = False
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.seconds = 0.0
+
+    def get(self) -> Any:
+        with self.lock:
+            if not self.done:
+                t0 = time.perf_counter()
+                try:
+                    self.value = self.build()
+                except Exception as e:
+                    self.error = e
+                self.seconds = time.perf_counter() - t0
+                self.done = True
+            if self.error is not None:
+                raise self.error
+            return self.value
+
+class StageGraph:
+    """
+    Runs the stages of one file on a thread pool as soon as their inputs are available.
+    Resources (e.g. the decoded matrix, the time axis, the channel layout) are built lazily and
+    at most once, so independent stages work on the same read-only arrays. NumPy releases the GIL
+    in the heavy kernels, stages on separate columns/outputs therefore really run in parallel.
+    """
+    def __init__(self, stages: list[Stage], resources: dict[str, Callable[[], Any]], executor: Optional[ThreadPoolExecutor] = None) -> None:
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        for s in stages:
+            unknown = [i for i in s.inputs if i not in resources and i not in names]
+            if unknown:
+                raise ValueError(f"Stage {s.name!r} has unknown inputs {unknown}")
+            if s.name in resources:
+                raise ValueError(f"Stage {s.name!r} shadows a resource")
+        self.stages = {s.name: s for s in stages}
+        self.resources = {k: _Resource(v) for k, v in resources.items()}
+        self.executor = executor or get_stage_executor()
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        state: dict[str, int] = {}  # 1 visiting, 2 done
+
+        def visit(name: str) -> None:
+            if state.get(name) == 2 or name in self.resources:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Stage graph has a cycle through {name!r}")
+            state[name] = 1
+            for i in self.stages[name].inputs:
+                visit(i)
+            state[name] = 2
+
+        for name in self.stages:
+            visit(name)
+
+    def resource(self, name: str) -> Any:
+        """Value of a resource, built on first access."""
+        return self.resources[name].get()
+
+    def _call(self, stage: Stage, results: dict[str, StageRun]) -> StageRun:
+        t0 = time.perf_counter()
+        try:
+            kwargs = {i: self.resource(i) if i in self.resources else results[i].value for i in stage.inputs}
+            return StageRun(value=stage.fn(**kwargs), seconds=time.perf_counter() - t0)
+        except Exception as e:
+            return StageRun(error=e, seconds=time.perf_counter() - t0)
+
+    def run(self, label: str = "") -> GraphRun:
+        """
+        Run all stages, each once all of its input stages succeeded.
+
+        Args:
+            label: Shown in the log messages, e.g. the file name.
+
+        Returns:
+            GraphRun: Outcome and timing of every stage.
+
+        Raises:
+            Exception: The error of the first failed required stage, after all running stages finished.
+        """
+        results: dict[str, StageRun] = {}
+        pending = dict(self.stages)
+        running: dict[Future, str] = {}
+        failed_required: Optional[BaseException] = None
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                deps = [i for i in stage.inputs if i in self.stages]
+                if any(i not in results for i in deps):
+                    continue
+                del pending[name]
+                blocked = [i for i in deps if results[i].error is not None or results[i].skipped]
+                if blocked or failed_required is not None:
+                    results[name] = StageRun(skipped=True)
+                    if blocked:
+                        logger.debug(f"Skipped stage {name!r} of {label}, failed inputs {blocked}.")
+                    continue
+                running[self.executor.submit(self._call, stage, results)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                run = future.result()
+                results[name] = run
+                if run.error is not None:
+                    if self.stages[name].required:
+                        failed_required = failed_required or run.error
+                    elif not any(r.error is run.error for r in self.resources.values()):  # resource errors surface through the required stages
+                        logger.error(f"Stage {name!r} failed for {label}", exc_info=run.error)
+
+        graph_run = GraphRun(stages=results, resources={k: r.seconds for k, r in self.resources.items() if r.done})
+        logger.debug(f"Stages of {label}: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in graph_run.timings.items()))
+        if failed_required is not None:
+            raise failed_required
+        return graph_run
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool of the stage graphs, shared by all pipeline workers."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, ANALYSIS_THREADS), thread_name_prefix="stage")
+        return _executor
@@ -0,0 +1,311 @@
+from fnmatch import fnmatchcase
+import json
+import os
+import threading
+from typing import Optional
+import warnings
+
+import numpy as np
+
+
+STATS_DTYPE = os.getenv("STATS_DTYPE", "float64")  # float32 halves the memory traffic of the kernel
+
+# stat name -> column name in the stats CSV/DataFrame, the Redis field is '<sensor>:<stat>'
+STAT_COLUMNS = {
+    "mean": "Mean",
+    "min": "Minimum",
+    "max": "Maximum",
+    "std": "Std",
+    "rms": "RMS",
+    "ptp": "PeakToPeak",
+    "nonfinite": "NonFinite",
+}
+
+# Data quality checks, computed with the statistics when the sample rate is known
+QC_FLATLINE_SEC = float(os.getenv("QC_FLATLINE_SEC", "20"))  # longest run of identical samples, 0 disables the check
+QC_SPIKE_Z = float(os.getenv("QC_SPIKE_Z", "8"))  # robust z-score (median/MAD) of a spike
+QC_SPIKE_RATIO = float(os.getenv("QC_SPIKE_RATIO", "0.001"))
+QC_ROBUST_SAMPLES = int(os.getenv("QC_ROBUST_SAMPLES", "8192"))  # samples used for median/MAD
+QC_SATURATION_RATIO = float(os.getenv("QC_SATURATION_RATIO", "0.01"))  # share of samples sitting on min or max
+QC_SATURATION_MIN_SAMPLES = int(os.getenv("QC_SATURATION_MIN_SAMPLES", "5"))  # on the rail, the min and max sample alone are 2
+# Digital/status channels of the Q.station (alarm outputs, door switch, mains, UPS, lightning and battery
+# monitors, lifecycle counter), constant or 0/1 by design. Matched case-insensitively.
+QC_EXCLUDE = [p.strip() for p in os.getenv(
+    "QC_EXCLUDE",
+    "*_GAL,*_RAL,Tuerschalter,Netz*Ausfall,USV*Betrieb,Blitz*berwachung,Batt*berwachung,LIFECYCLE_*",
+).split(",") if p.strip()]
+QC_RULES_PATH = os.getenv("QC_RULES_PATH", "")  # JSON list of per-channel thresholds, empty uses DEFAULT_QC_RULES
+
+# Per-channel overrides of the QC_* thresholds, later rules win. A rule matches channels by 'pattern'
+# (glob or list of globs, case-insensitive) and optionally one stream by 'sample_rate' (Hz), and sets
+# any of QC_THRESHOLDS. Temperatures change slower than a file is long, a flat run says nothing there.
+DEFAULT_QC_RULES = [
+    {"pattern": ["T_*", "DELTA_T_*"], "flatline_sec": 0},
+]
+QC_THRESHOLDS = {
+    "flatline_sec": QC_FLATLINE_SEC,
+    "saturation_ratio": QC_SATURATION_RATIO,
+    "saturation_min_samples": QC_SATURATION_MIN_SAMPLES,
+}
+
+QC_FLATLINE = 1
+QC_NONFINITE = 2
+QC_SPIKES = 4
+QC_SATURATED = 8
+
+# stat name -> column name, published like STAT_COLUMNS. 'qc' is the bitmask of the QC_* flags.
+QC_COLUMNS = {
+    "qc": "QC",
+    "flatline_sec": "FlatlineSec",
+    "spike_ratio": "SpikeRatio",
+    "saturation": "Saturation",
+}
+
+def channel_statistics(
+    values: np.ndarray,
+    dtype: Optional[str] = STATS_DTYPE,
+    sample_rate: Optional[float] = None,
+    thresholds: Optional[dict[str, np.ndarray]] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Compute all statistics of STAT_COLUMNS for all channels at once along axis 0.
+    The matrix is made contiguous (optionally float32) once, then every statistic is a single
+    reduction over all channels. Sums are accumulated in float64 around the first finite sample
+    of each channel, which keeps std exact for channels with a large offset.
+    Non-finite samples propagate into mean/min/max like np.mean/np.min/np.max, 'nonfinite' counts them.
+
+    Args:
+        values: Samples x channels, without the timestamp column.
+        dtype: Working dtype of the contiguous copy, None keeps the input dtype.
+        sample_rate: If given, the QC_COLUMNS checks (see channel_quality) run on the same copy.
+        thresholds: Per-channel QC thresholds (see qc_thresholds), the QC_* defaults if None.
+
+    Returns:
+        dict: Stat name -> float64 array with one value per channel, plus 'count' (samples per channel).
+    """
+    x = np.ascontiguousarray(values, dtype=dtype or values.dtype)
+    n = x.shape[0]
+    if n == 0:
+        empty = np.full(x.shape[1], np.nan)
+        out = {**{k: empty.copy() for k in STAT_COLUMNS}, "nonfinite": np.zeros(x.shape[1]), "count": np.zeros(x.shape[1])}
+        if sample_rate:
+            out.update({k: empty.copy() for k in QC_COLUMNS}, qc=np.zeros(x.shape[1]))
+        return out
+
+    finite = np.isfinite(x)
+    shift = np.where(finite[0], x[0], 0).astype(x.dtype)
+    d = x - shift
+    s = d.sum(axis=0, dtype=np.float64)
+    ss = np.einsum("ij,ij->j", d, d, dtype=np.float64)
+
+    mean_d = s / n
+    mean = shift + mean_d
+    var = np.maximum(ss / n - mean_d * mean_d, 0.0)
+    vmin = x.min(axis=0).astype(np.float64)
+    vmax = x.max(axis=0).astype(np.float64)
+    n_finite = finite.sum(axis=0)
+
+    out = {
+        "mean": mean,
+        "min": vmin,
+        "max": vmax,
+        "std": np.sqrt(var),
+        "rms": np.sqrt(var + mean * mean),
+        "ptp": vmax - vmin,
+        "nonfinite": (n - n_finite).astype(np.float64),
+        "count": np.full(x.shape[1], float(n)),
+    }
+    if sample_rate:
+        out.update(channel_quality(x, finite, n_finite, sample_rate, thresholds))
+    return out
+
+def channel_quality(
+    x: np.ndarray,
+    finite: np.ndarray,
+    n_finite: np.ndarray,
+    sample_rate: float,
+    thresholds: Optional[dict[str, np.ndarray]] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Data quality checks of all channels, on the working copy and finite mask of channel_statistics:
+    longest flatline (run of identical samples of at least flatline_sec, 0 disables it), non-finite
+    samples, spikes (robust z-score against median and MAD above QC_SPIKE_Z) and saturation (more than
+    saturation_ratio of the samples, and at least saturation_min_samples, on the min or max of a varying
+    channel). A channel with no sample between its min and max (two-level signal) is never saturated.
+
+    Args:
+        x: Contiguous samples x channels.
+        finite: np.isfinite(x).
+        n_finite: Finite samples per channel.
+        sample_rate: Sample rate in Hz.
+        thresholds: Key of QC_THRESHOLDS -> value per channel (see qc_thresholds), the QC_* defaults if None.
+
+    Returns:
+        dict: Stat of QC_COLUMNS -> float64 array with one value per channel.
+    """
+    n, n_ch = x.shape
+    limits = thresholds or QC_THRESHOLDS
+    # Longest run of identical samples: distance of every sample to the last change, all channels at once
+    if n > 1:
+        idx = np.arange(n - 1)[:, None]
+        last_change = np.maximum.accumulate(np.where(x[1:] != x[:-1], idx, -1), axis=0)
+        longest = (idx - last_change).max(axis=0) + 1.0
+    else:
+        longest = np.ones(n_ch)
+    flatline_sec = longest / sample_rate
+
+    # Median and MAD from a strided subsample, the spikes are counted on all samples
+    xf = np.where(finite, x, np.nan)
+    sub = xf[::max(1, n // QC_ROBUST_SAMPLES)]
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN channels
+        median = np.nanmedian(sub, axis=0)
+        mad = np.nanmedian(np.abs(sub - median), axis=0)
+    dev = np.abs(xf - median)
+    scale = np.where(mad > 0, 1.4826 * mad, np.inf)  # constant channels have no spikes
+    with np.errstate(invalid="ignore"):
+        spikes = (dev > QC_SPIKE_Z * scale).sum(axis=0)
+        spike_ratio = np.where(n_finite > 0, spikes / np.maximum(n_finite, 1), np.nan)
+
+        vmin = np.where(finite, x, np.inf).min(axis=0)
+        vmax = np.where(finite, x, -np.inf).max(axis=0)
+        on_rail = ((xf == vmin) | (xf == vmax)).sum(axis=0)
+        saturation = np.where(vmax > vmin, on_rail / np.maximum(n_finite, 1), 0.0)
+
+    qc = np.zeros(n_ch, dtype=np.int64)
+    flatline_limit = np.asarray(limits["flatline_sec"], dtype=np.float64)
+    qc |= np.where((flatline_limit > 0) & (flatline_sec >= flatline_limit) & (longest > 1), QC_FLATLINE, 0)
+    qc |= np.where(n_finite < n, QC_NONFINITE, 0)
+    qc |= np.where(spike_ratio > QC_SPIKE_RATIO, QC_SPIKES, 0)
+    saturated = (saturation > limits["saturation_ratio"]) & (on_rail >= limits["saturation_min_samples"]) & (on_rail < n_finite)
+    qc |= np.where(saturated, QC_SATURATED, 0)
+    return {
+        "qc": qc.astype(np.float64),
+        "flatline_sec": flatline_sec.astype(np.float64),
+        "spike_ratio": spike_ratio.astype(np.float64),
+        "saturation": saturation.astype(np.float64),
+    }
+
+def _matches(name: str, patterns: list[str]) -> bool:
+    return any(fnmatchcase(name.lower(), p.lower()) for p in patterns)
+
+def qc_excluded(channel_names: list[str], patterns: list[str] = QC_EXCLUDE) -> np.ndarray:
+    """Bool per channel, True for channels without data quality checks (digital/status channels)."""
+    return np.array([_matches(name, patterns) for name in channel_names], dtype=bool)
+
+def load_qc_rules(path: str = QC_RULES_PATH) -> list[dict]:
+    """Per-channel QC thresholds from a JSON file (list of {pattern, sample_rate, <QC_THRESHOLDS>}) or DEFAULT_QC_RULES."""
+    if not path:
+        return DEFAULT_QC_RULES
+    with open(path) as f:
+        rules = json.load(f)
+    for rule in rules:
+        unknown = set(rule) - {"pattern", "sample_rate", *QC_THRESHOLDS}
+        if unknown:
+            raise ValueError(f"QC rule {rule.get('pattern')!r}: unknown keys {sorted(unknown)}")
+    return rules
+
+_qc_rules: Optional[list[dict]] = None
+_qc_rules_lock = threading.Lock()
+
+def get_qc_rules() -> list[dict]:
+    """Process-wide QC rules of QC_RULES_PATH."""
+    global _qc_rules
+    with _qc_rules_lock:
+        if _qc_rules is None:
+            _qc_rules = load_qc_rules()
+        return _qc_rules
+
+def qc_thresholds(channel_names: list[str], sample_rate: float, rules: Optional[list[dict]] = None) -> dict[str, np.ndarray]:
+    """
+    QC thresholds of every channel: the QC_* defaults, overridden by the matching rules.
+
+    Args:
+        channel_names: Sensor channels, without the timestamp.
+        sample_rate: Sample rate of the file in Hz, selects the rules of its stream.
+        rules: Rules as of load_qc_rules, get_qc_rules() if None.
+
+    Returns:
+        dict: Key of QC_THRESHOLDS -> float64 array with one value per channel.
+    """
+    out = {k: np.full(len(channel_names), float(v)) for k, v in QC_THRESHOLDS.items()}
+    for rule in (get_qc_rules() if rules is None else rules):
+        if "sample_rate" in rule and not np.isclose(float(rule["sample_rate"]), sample_rate):
+            continue
+        pattern = rule["pattern"]
+        patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+        hit = np.array([_matches(name, patterns) for name in channel_names], dtype=bool)
+        for k in QC_THRESHOLDS:
+            if k in rule:
+                out[k][hit] = float(rule[k])
+    return out
+
+WINDOW_STATS = ("mean", "min", "max", "std")
+
+def windowed_statistics(values: np.ndarray, window: int, dtype: Optional[str] = STATS_DTYPE) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Per-window mean/min/max/std of all channels. The matrix is reshaped into
+    (windows, window, channels) and reduced along axis 1, a trailing partial window is
+    reduced as a second block, so there is no Python loop per window.
+
+    Args:
+        values: Samples x channels, without the timestamp column.
+        window: Samples per window.
+        dtype: Working dtype, None keeps the input dtype.
+
+    Returns:
+        tuple: Start sample index of every window, dict stat -> float32 array (windows x channels).
+    """
+    x = np.asarray(values, dtype=dtype or values.dtype)
+    n, n_ch = x.shape
+    window = max(1, int(window))
+    n_full = n // window
+    parts = []
+    if n_full:
+        parts.append(x[:n_full * window].reshape(n_full, window, n_ch))
+    if n % window:
+        parts.append(x[n_full * window:].reshape(1, n % window, n_ch))
+
+    out: dict[str, list[np.ndarray]] = {k: [] for k in WINDOW_STATS}
+    for blocks in parts:
+        mean = blocks.mean(axis=1, dtype=np.float64)
+        out["mean"].append(mean)
+        out["min"].append(blocks.min(axis=1))
+        out["max"].append(blocks.max(axis=1))
+        out["std"].append(blocks.std(axis=1, dtype=np.float64))
+
+    starts = np.arange(0, n, window)
+    stats = {k: (np.concatenate(v).astype(np.float32) if v else np.empty((0, n_ch), np.float32)) for k, v in out.items()}
+    return starts, stats
+
+MOMENT_FIELDS = ("count", "mean", "m2", "min", "max")
+
+def channel_moments(values: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Mergeable aggregates of all channels over the finite samples: count, mean, sum of squared
+    deviations from the mean (m2), min, max. Two sets merge with Chan's formula
+    (mean weighted by count, m2 plus the squared difference of the means), which the roll-ups
+    rely on, the variance never comes from raw sums of squares that cancel at large offsets.
+    A channel without finite samples has count 0, mean and m2 0 and NaN min/max.
+
+    Args:
+        values: Samples x channels, without the timestamp column.
+
+    Returns:
+        dict: Field of MOMENT_FIELDS -> float64 array with one value per channel.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(x)
+    count = finite.sum(axis=0).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, np.where(finite, x, 0.0).sum(axis=0) / count, 0.0)
+        d = np.where(finite, x - mean, 0.0)
+        vmin = np.where(count > 0, np.where(finite, x, np.inf).min(axis=0, initial=np.inf), np.nan)
+        vmax = np.where(count > 0, np.where(finite, x, -np.inf).max(axis=0, initial=-np.inf), np.nan)
+    return {
+        "count": count,
+        "mean": mean,
+        "m2": np.einsum("ij,ij->j", d, d),
+        "min": vmin,
+        "max": vmax,
+    }
@@ -0,0 +1,390 @@
+import atexit
+from dataclasses import dataclass
+import datetime
+import hashlib
+import logging
+import os
+from pathlib import Path
+import re
+import struct
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+STATS_FLUSH_ROWS = int(os.getenv("STATS_FLUSH_ROWS", "1000000"))  # buffered rows before a part file is written
+STATS_FLUSH_SEC = float(os.getenv("STATS_FLUSH_SEC", "600"))  # max age of the buffer before a part file is written
+STATS_COMPACT_PARTS = int(os.getenv("STATS_COMPACT_PARTS", "24"))  # parts of the current day before they are merged into one
+STATS_COMPACT_SEC = float(os.getenv("STATS_COMPACT_SEC", "900"))  # interval of the background compaction
+
+WAL_NAME = "_wal.arrows"
+WAL_FRAME = struct.Struct("<QQ")  # sequence number, length of the Arrow IPC stream that follows
+PART_RE = re.compile(r"^part-(\d+)-(\d+)\.parquet$")
+
+def _day(file_time_ns: int) -> str:
+    return datetime.datetime.fromtimestamp(file_time_ns / 1e9, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+def _utc_naive(t: datetime.datetime) -> pd.Timestamp:
+    """Timestamp comparable with the UTC-naive file_time column, aware times are converted to UTC first."""
+    ts = pd.Timestamp(t)
+    return ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo is not None else ts
+
+@dataclass
+class StatsBatch:
+    """Rows of one file as an Arrow table, plus the table serialized as the WAL payload."""
+    table: Any  # pyarrow.Table
+    payload: bytes
+
+def _batch(columns: dict[str, Any]) -> StatsBatch:
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return StatsBatch(table, sink.getvalue().to_pybytes())
+
+def file_batch(file_time_ns: int, file: str, channels: list[str], stats: dict[str, np.ndarray]) -> StatsBatch:
+    """
+    Statistics of one file, one row per channel. Built outside the commit turn, see StatsDataset.append.
+
+    Args:
+        file_time_ns: Time of the first sample, ns since epoch.
+        file: Source file name.
+        channels: Channel names.
+        stats: Stat name -> one value per channel.
+    """
+    import pyarrow as pa
+
+    n = len(channels)
+    return _batch({
+        "file_time": pa.array(np.full(n, file_time_ns, dtype="datetime64[ns]")),
+        "file": pa.array([file] * n, pa.string()),
+        "channel": pa.array(channels, pa.string()),
+        **{k: np.asarray(v, dtype=np.float64) for k, v in stats.items()},
+    })
+
+def window_batch(file: str, window_stats: dict[str, np.ndarray]) -> StatsBatch:
+    """
+    Window statistics of one file (see DataConverterUDBF.compute_window_statistics), one row per
+    window and channel with the window start as file_time, window-major like the arrays.
+
+    Args:
+        file: Source file name.
+        window_stats: 'time', 'channels', 'window_sec' and one windows x channels array per stat.
+    """
+    import pyarrow as pa
+
+    times = np.asarray(window_stats["time"], dtype=np.int64)
+    channels = np.asarray(window_stats["channels"]).astype(str)
+    n = len(times) * len(channels)
+    return _batch({
+        "file_time": pa.array(np.repeat(times, len(channels)).astype("datetime64[ns]")),
+        "file": pa.array([file] * n, pa.string()),
+        "channel": pa.array(np.tile(channels, len(times)), pa.string()),
+        "window_sec": np.full(n, float(window_stats["window_sec"])),
+        **{
+            k: np.asarray(v, dtype=np.float64).reshape(-1)
+            for k, v in window_stats.items() if k not in ("time", "channels", "window_sec")
+        },
+    })
+
+def _with_seq(seq: int, table):
+    import pyarrow as pa
+
+    return table.add_column(0, "seq", pa.array(np.full(table.num_rows, seq, dtype=np.int64)))
+
+def _days(table) -> np.ndarray:
+    """UTC day of every row as datetime64[D]."""
+    return table["file_time"].to_numpy().astype("datetime64[D]")
+
+class StatsDataset:
+    """
+    Statistics of all processed files as one columnar dataset, partitioned by day:
+    <root>/date=YYYY-MM-DD/part-<first seq>-<last seq>.parquet, one row per file and channel.
+    Every append is one Arrow table (see file_batch/window_batch, built outside the commit turn),
+    tables are buffered and written as one part per day and flush. Each append is first written to
+    a write-ahead log (framed Arrow IPC streams) so a restart loses nothing. The WAL should live in
+    local state ('wal_dir'), it is handed to the OS on every append (survives a crash of the process)
+    but only fsynced on close. Parts become visible atomically (temp file + rename), the sequence
+    numbers in the part names tell which WAL rows are committed.
+    Small parts are merged by a background thread (see start), never in the commit turn: past days
+    into one part, the current day once it has 'compact_parts' parts.
+    """
+    def __init__(
+        self,
+        root: str | Path,
+        flush_rows: int = STATS_FLUSH_ROWS,
+        flush_sec: float = STATS_FLUSH_SEC,
+        wal_dir: Optional[str | Path] = None,
+        compact_parts: int = STATS_COMPACT_PARTS,
+    ) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        self.compact_parts = compact_parts
+        if wal_dir:
+            Path(wal_dir).mkdir(parents=True, exist_ok=True)
+            # One WAL per dataset in the shared state dir, named after the dataset root
+            self.wal_path = Path(wal_dir) / f"stats_wal_{self.root.name}_{hashlib.sha1(str(self.root.resolve()).encode()).hexdigest()[:8]}.arrows"
+        else:
+            self.wal_path = self.root / WAL_NAME
+        self._lock = threading.RLock()
+        self._parts_lock = threading.Lock()  # compaction swapping parts vs. readers listing them
+        self._tables: list = []  # (seq, table) of every buffered append
+        self._n_rows = 0
+        self._buffer_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        committed = self._committed_ranges()
+        self._seq = max((last for ranges in committed.values() for _, last in ranges), default=-1) + 1
+        self._replay_wal(committed)
+        self._wal = open(self.wal_path, "ab")
+
+    def _committed_ranges(self) -> dict[str, list[tuple[int, int]]]:
+        """Sequence ranges of the written parts per day."""
+        committed: dict[str, list[tuple[int, int]]] = {}
+        for part_dir in self.root.glob("date=*"):
+            parts = {p: tuple(map(int, PART_RE.match(p.name).groups())) for p in part_dir.glob("part-*.parquet") if PART_RE.match(p.name)}
+            for p, (first, last) in parts.items():
+                # Leftover of an interrupted compaction, its rows are in the merged part.
+                if any(q != p and a <= first and last <= b for q, (a, b) in parts.items()):
+                    logger.info(f"Removing superseded stats part {p}.")
+                    p.unlink()
+                    continue
+                committed.setdefault(part_dir.name[len("date="):], []).append((first, last))
+        return committed
+
+    def _replay_wal(self, committed: dict[str, list[tuple[int, int]]]) -> None:
+        import pyarrow as pa
+
+        wal = self.wal_path
+        if not wal.exists():
+            return
+        data = wal.read_bytes()
+        pos = 0
+        while pos < len(data):
+            if len(data) - pos < WAL_FRAME.size:
+                logger.warning(f"Skipping torn frame at the end of {wal}.")
+                break
+            seq, length = WAL_FRAME.unpack_from(data, pos)
+            pos += WAL_FRAME.size
+            if len(data) - pos < length:
+                logger.warning(f"Skipping torn frame at the end of {wal}.")
+                break
+            table = pa.ipc.open_stream(data[pos:pos + length]).read_all()
+            pos += length
+            self._seq = max(self._seq, seq + 1)
+            # A flush writes one part per day, a crash between them leaves some days uncommitted.
+            days = _days(table)
+            keep = np.ones(table.num_rows, dtype=bool)
+            for day in np.unique(days):
+                if any(first <= seq <= last for first, last in committed.get(str(day), ())):
+                    keep &= days != day
+            if keep.any():
+                table = table if keep.all() else table.filter(pa.array(keep))
+                self._tables.append((seq, table))
+                self._n_rows += table.num_rows
+        if self._tables:
+            self._buffer_since = time.monotonic()
+            logger.info(f"Recovered {self._n_rows} uncommitted stats rows from {wal}.")
+
+    def append(self, batch: StatsBatch) -> None:
+        """
+        Log the rows of one file under one sequence number and flush if the buffer is full or old enough.
+        Only this step needs the file order (commit turn), the batch is built before.
+
+        Args:
+            batch: Output of file_batch or window_batch.
+        """
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+            self._wal.write(WAL_FRAME.pack(seq, len(batch.payload)) + batch.payload)
+            self._wal.flush()
+            self._tables.append((seq, batch.table))
+            self._n_rows += batch.table.num_rows
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+            if self._n_rows >= self.flush_rows or time.monotonic() - self._buffer_since >= self.flush_sec:
+                self.flush()
+
+    def _pending(self):
+        """Buffered rows as one table with the seq column, None if empty."""
+        import pyarrow as pa
+
+        if not self._tables:
+            return None
+        return pa.concat_tables([_with_seq(seq, t) for seq, t in self._tables], promote_options="default")
+
+    def flush(self) -> None:
+        """Write the buffered rows as one part per day and reset the WAL."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            table = self._pending()
+            if table is None:
+                return
+            days = _days(table)
+            seqs = table["seq"].to_numpy()
+            for day in np.unique(days):
+                mask = days == day
+                part_dir = self.root / f"date={day}"
+                part_dir.mkdir(exist_ok=True)
+                name = f"part-{int(seqs[mask].min())}-{int(seqs[mask].max())}.parquet"
+                tmp = part_dir / f".{name}.tmp"
+                pq.write_table(table.filter(pa.array(mask)), tmp, compression="zstd")
+                os.replace(tmp, part_dir / name)
+
+            # All rows are in parts now, the WAL can start over.
+            self._wal.close()
+            self._wal = open(self.wal_path, "wb")
+            logger.debug(f"Flushed {table.num_rows} stats rows to {self.root}.")
+            self._tables = []
+            self._n_rows = 0
+            self._buffer_since = None
+
+    def compact(self, day: str, min_parts: int = 2) -> bool:
+        """
+        Merge the parts of one day into a single part once it has at least min_parts. The parts are
+        streamed into the new file one at a time (in sequence order), so memory stays at one part,
+        and only the merged parts are removed, parts flushed meanwhile stay. Does not block appends.
+
+        Returns:
+            bool: True if the day was compacted.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        part_dir = self.root / f"date={day}"
+        parts = [p for p in part_dir.glob("part-*.parquet") if PART_RE.match(p.name)]
+        if len(parts) < max(2, min_parts):
+            return False
+        seqs = {p: tuple(map(int, PART_RE.match(p.name).groups())) for p in parts}
+        parts.sort(key=seqs.get)
+        schema = pa.unify_schemas([pq.read_schema(p) for p in parts])
+        name = f"part-{min(s[0] for s in seqs.values())}-{max(s[1] for s in seqs.values())}.parquet"
+        tmp = part_dir / f".{name}.tmp"
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for p in parts:
+                table = pq.read_table(p)
+                for field in schema:
+                    if field.name not in table.column_names:
+                        table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+                writer.write_table(table.select(schema.names).cast(schema))
+        with self._parts_lock:
+            os.replace(tmp, part_dir / name)
+            for p in parts:
+                if p.name != name:
+                    p.unlink()
+        logger.debug(f"Compacted {len(parts)} stats parts of {day}.")
+        return True
+
+    def compact_all(self) -> int:
+        """
+        Compact every past day with more than one part and the current day from compact_parts on.
+
+        Returns:
+            int: Number of days compacted.
+        """
+        today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+        compacted = 0
+        for part_dir in sorted(self.root.glob("date=*")):
+            day = part_dir.name[len("date="):]
+            if day <= today:
+                compacted += self.compact(day, 2 if day < today else self.compact_parts)
+        return compacted
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.compact_all()
+            except Exception:
+                logger.exception(f"Compaction of {self.root} failed.")
+
+    def start(self, interval: float = STATS_COMPACT_SEC) -> threading.Thread:
+        """Start the background compaction, every 'interval' seconds."""
+        self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True, name=f"compact:{self.root.name}")
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def read(self, start: datetime.datetime, end: datetime.datetime, channels: Optional[list[str]] = None) -> pd.DataFrame:
+        """
+        Statistics rows with start <= file_time < end, including rows not flushed yet.
+
+        Args:
+            start: Start of the range (naive = UTC, aware is converted to UTC).
+            end: End of the range (exclusive), like start.
+            channels: Only these channels, all if None.
+
+        Returns:
+            DataFrame: One row per file and channel, sorted by file_time.
+        """
+        import pyarrow.parquet as pq
+
+        start_ts, end_ts = _utc_naive(start), _utc_naive(end)
+        filters = [("file_time", ">=", start_ts), ("file_time", "<", end_ts)]
+        if channels is not None:
+            filters.append(("channel", "in", list(channels)))
+
+        frames = []
+        day = start_ts.normalize()
+        with self._parts_lock:
+            while day < end_ts:
+                for part in sorted((self.root / f"date={day:%Y-%m-%d}").glob("part-*.parquet")):
+                    frames.append(pq.read_table(part, filters=filters).to_pandas())
+                day += pd.Timedelta(days=1)
+
+        with self._lock:
+            table = self._pending()
+        if table is not None:
+            pending = table.to_pandas()
+            mask = (pending["file_time"] >= start_ts) & (pending["file_time"] < end_ts)
+            if channels is not None:
+                mask &= pending["channel"].isin(channels)
+            frames.append(pending[mask])
+
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values(["file_time", "channel"], ignore_index=True)
+
+    def close(self) -> None:
+        self.stop()
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+                self._wal.close()
+
+_datasets: dict[str, StatsDataset] = {}
+_datasets_lock = threading.Lock()
+
+def get_stats_dataset(root: str | Path, wal_dir: Optional[str | Path] = None) -> StatsDataset:
+    """
+    Process-wide dataset per root directory with its background compaction, flushed on interpreter exit.
+
+    Args:
+        root: Dataset directory (may be on the network share).
+        wal_dir: Local directory of the WAL, the dataset root if None. Only used on first access.
+    """
+    key = str(root)
+    with _datasets_lock:
+        if key not in _datasets:
+            _datasets[key] = StatsDataset(root, wal_dir=wal_dir)
+            _datasets[key].start()
+            atexit.register(_datasets[key].close)
+        return _datasets[key]
@@ -0,0 +1,281 @@
+from dataclasses import dataclass, field
+import logging
+import mmap
+import struct
+import sys
+from typing import Optional
+
+import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
+
+
+logger = logging.getLogger(__name__)
+
+OLE_SECONDS_PER_DAY = 86400.0
+SEPARATION_CHAR = ord("*")
+TIMESTAMP_NAME = "Timestamp"
+
+# UDBF data type codes -> numpy type codes (without byte order)
+UDBF_DTYPES = {
+    1: "u1",   # Boolean
+    2: "i1",   # SignedInt8
+    3: "u1",   # UnSignedInt8
+    4: "i2",   # SignedInt16
+    5: "u2",   # UnSignedInt16
+    6: "i4",   # SignedInt32
+    7: "u4",   # UnSignedInt32
+    8: "f4",   # Float
+    9: "u1",   # BitSet8
+    10: "u2",  # BitSet16
+    11: "u4",  # BitSet32
+    12: "f8",  # Double
+    13: "i8",  # SignedInt64
+    14: "u8",  # UnSignedInt64
+    15: "u8",  # BitSet64
+}
+
+@dataclass
+class UDBFVariable:
+    name: str
+    unit: str
+    data_type: int
+    direction: int
+    field_len: int
+    precision: int
+
+@dataclass
+class UDBFHeader:
+    big_endian: bool
+    version: int
+    vendor: str
+    start_time_to_day_factor: float
+    act_time_data_type: int
+    act_time_to_second_factor: float
+    start_time: float
+    sample_rate: float
+    variables: list[UDBFVariable] = field(default_factory=list)
+    data_offset: int = 0
+    raw: bytes = b""
+
+    @property
+    def record_dtype(self) -> np.dtype:
+        """Packed structured dtype of one sample record: time stamp followed by all variables."""
+        order = ">" if self.big_endian else "<"
+        fields = [("__time__", order + _np_code(self.act_time_data_type))]
+        fields += [(f"v{i}", order + _np_code(v.data_type)) for i, v in enumerate(self.variables)]
+        return np.dtype(fields)
+
+    @property
+    def channel_names(self) -> list[str]:
+        return [TIMESTAMP_NAME] + [v.name for v in self.variables]
+
+    @property
+    def channel_units(self) -> list[str]:
+        return ["days"] + [v.unit for v in self.variables]
+
+def _np_code(data_type: int) -> str:
+    try:
+        return UDBF_DTYPES[data_type]
+    except KeyError:
+        raise ValueError(f"Unsupported UDBF data type {data_type}")
+
+def _decode_str(raw: bytes) -> str:
+    raw = raw.split(b"\x00", 1)[0]
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1", errors="replace")
+
+class _Cursor:
+    def __init__(self, buf: bytes | mmap.mmap, order: str) -> None:
+        self.buf = buf
+        self.pos = 0
+        self.order = order
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(self.order + fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(self.order + fmt)
+        return values[0] if len(values) == 1 else values
+
+    def take(self, n: int) -> bytes:
+        raw = bytes(self.buf[self.pos:self.pos + n])
+        if len(raw) != n:
+            raise ValueError("Truncated UDBF header")
+        self.pos += n
+        return raw
+
+    def string(self) -> str:
+        return _decode_str(self.take(self.unpack("H")))
+
+def parse_header(buf: bytes | mmap.mmap) -> UDBFHeader:
+    """
+    Parse the UDBF (v1.07) header: byte order, vendor, time base, sample rate and the variable table.
+
+    Args:
+        buf: File content or at least its header.
+
+    Returns:
+        UDBFHeader: Parsed header, data_offset points at the first sample record.
+
+    Raises:
+        ValueError: Not a UDBF file or unsupported data type.
+    """
+    if len(buf) < 3:
+        raise ValueError("File too small for a UDBF header")
+    big_endian = buf[0] == 1
+    cur = _Cursor(buf, ">" if big_endian else "<")
+    cur.pos = 1
+    try:
+        version = cur.unpack("H")
+        vendor = cur.string()
+        cur.unpack("B")  # WithCheckSum
+        module_data_len = cur.unpack("H")
+        if module_data_len:
+            cur.take(module_data_len)
+        header = UDBFHeader(
+            big_endian=big_endian,
+            version=version,
+            vendor=vendor,
+            start_time_to_day_factor=cur.unpack("d"),
+            act_time_data_type=cur.unpack("H"),
+            act_time_to_second_factor=cur.unpack("d"),
+            start_time=cur.unpack("d"),
+            sample_rate=cur.unpack("d"),
+        )
+        for _ in range(cur.unpack("H")):
+            name = cur.string()
+            direction = cur.unpack("H")
+            data_type = cur.unpack("H")
+            field_len = cur.unpack("H")
+            precision = cur.unpack("H")
+            unit = cur.string()
+            additional_len = cur.unpack("H")
+            if additional_len:
+                cur.take(additional_len)
+            _np_code(data_type)
+            header.variables.append(UDBFVariable(name, unit.strip(), data_type, direction, field_len, precision))
+    except struct.error:
+        raise ValueError("Truncated UDBF header")
+
+    # Separation chars: data starts at the last 8 byte aligned offset within the run of '*'.
+    end = cur.pos
+    run_end = end
+    while run_end < len(buf) and buf[run_end] == SEPARATION_CHAR:
+        run_end += 1
+    aligned = run_end - run_end % 8
+    header.data_offset = aligned if aligned >= end else run_end
+    header.raw = bytes(buf[:end])
+    return header
+
+@dataclass
+class UDBFFile:
+    header: UDBFHeader
+    records: np.ndarray  # structured, read-only view on the file mapping
+
+    def timestamps(self) -> np.ndarray:
+        """OLE timestamps (days since 1899-12-30) of all records."""
+        h = self.header
+        start_days = h.start_time * h.start_time_to_day_factor
+        return start_days + self.records["__time__"].astype(np.float64) * (h.act_time_to_second_factor / OLE_SECONDS_PER_DAY)
+
+    def to_matrix(self, columns: Optional[list[int]] = None) -> np.ndarray:
+        """
+        Matrix in the layout of the Gantner reader: dat_file[row, column], OLE timestamp in column 0.
+        The selected fields of the record view are cast to float64 in a single structured conversion,
+        the timestamp columns are then scaled to OLE days in place.
+
+        Args:
+            columns: Channel indices (0 = timestamp) to materialize, all channels if None.
+
+        Returns:
+            np.ndarray: float64 matrix, one column per selected channel.
+        """
+        if columns is None:
+            columns = list(range(len(self.header.variables) + 1))
+        names = ["__time__" if c == 0 else f"v{c - 1}" for c in columns]
+        unique = list(dict.fromkeys(names))
+        # One conversion of the selected fields of the record view (mixed dtypes included) into a float64 matrix
+        out = structured_to_unstructured(self.records[unique], dtype=np.float64, copy=True)
+        if len(unique) != len(names):
+            out = out[:, [unique.index(n) for n in names]]
+        if "__time__" in unique:
+            h = self.header
+            ts = [j for j, n in enumerate(names) if n == "__time__"]
+            out[:, ts] = h.start_time * h.start_time_to_day_factor + out[:, ts] * (h.act_time_to_second_factor / OLE_SECONDS_PER_DAY)
+        return out
+
+def read_udbf(path_udbf: str) -> UDBFFile:
+    """
+    Map a .dat file into memory and expose its samples as a structured array without copying.
+    A trailing partial record is ignored and the records are cut at the first non increasing
+    time stamp, like read_gins_dat does.
+
+    Args:
+        path_udbf: Full path to the .dat file.
+
+    Returns:
+        UDBFFile: Header and records.
+    """
+    with open(path_udbf, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError(f"Empty file: {path_udbf}")
+    header = parse_header(mm)
+    dtype = header.record_dtype
+    n = max(0, (len(mm) - header.data_offset) // dtype.itemsize)
+    records = np.frombuffer(mm, dtype=dtype, count=n, offset=header.data_offset) if n else np.zeros(0, dtype=dtype)
+
+    if n > 1:
+        t = records["__time__"]
+        decreasing = np.flatnonzero(t[1:] <= t[:-1])
+        if decreasing.size:
+            records = records[:decreasing[0] + 1]
+    return UDBFFile(header=header, records=records)
+
+def decode_udbf_numpy(path_udbf: str) -> tuple[np.ndarray, list[str], float, list[str]]:
+    """
+    Drop-in replacement for DataConverterUDBF.decode_udbf without the Gantner library.
+
+    Returns:
+        tuple: Matrix dat_file[row, column] with the OLE timestamp in column 0, channel names, sample rate, channel units.
+    """
+    udbf = read_udbf(path_udbf)
+    names = [n.replace('-', '_') for n in udbf.header.channel_names]
+    return udbf.to_matrix(), names, udbf.header.sample_rate, udbf.header.channel_units
+
+def verify_against_native(path_udbf: str, rtol: float = 1e-9, atol: float = 1e-6) -> bool:
+    """
+    Decode a recorded file with both readers and log where they differ.
+
+    Returns:
+        bool: True if shape, sample rate, channel names (without the timestamp) and values match.
+    """
+    from gantner_operations.DataConverterUDBF import decode_udbf
+
+    data_n, names_n, rate_n, _ = decode_udbf(path_udbf)
+    data_p, names_p, rate_p, _ = decode_udbf_numpy(path_udbf)
+    ok = True
+    if data_n.shape != data_p.shape:
+        logger.error(f"{path_udbf}: shape native {data_n.shape} != numpy {data_p.shape}")
+        return False
+    if float(rate_n) != float(rate_p):
+        logger.error(f"{path_udbf}: sample rate native {rate_n} != numpy {rate_p}")
+        ok = False
+    if names_n[1:] != names_p[1:]:
+        logger.error(f"{path_udbf}: channel names differ: {names_n[1:]} != {names_p[1:]}")
+        ok = False
+    diff = np.abs(data_n - data_p)
+    bad = ~np.isclose(data_n, data_p, rtol=rtol, atol=atol, equal_nan=True)
+    for c in np.flatnonzero(bad.any(axis=0)):
+        logger.error(f"{path_udbf}: column {c} ({names_p[c]}) max abs diff {np.nanmax(diff[:, c])}")
+        ok = False
+    return ok
+
+if __name__ == "__main__":
+    # python -m gantner_operations.udbf_reader <file.dat> [...]: compare against the Gantner reader
+    logging.basicConfig(level=logging.INFO)
+    results = {p: verify_against_native(p) for p in sys.argv[1:]}
+    for p, ok in results.items():
+        print(f"{'OK  ' if ok else 'FAIL'} {p}")
+    sys.exit(0 if all(results.values()) else 1)
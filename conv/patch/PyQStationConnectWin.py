@@ -326,13 +326,20 @@ class ConnectGIns():
     
     def yield_buffer(self,NbFrames=int(100000),fillArray=0):
         '''function used to received the buffer content - the stream is considered 
-        like a generator 
+        like a generator, every yielded array owns its data 
         self.GINSDll._CD_eGateHighSpeedPort_ReadBufferToDoubleArray(self.HCONNECTION.value, 
         valuesPtr,(NbFrames*ChannelNb),fillArray,ReceivedFrames,ReceivedChannels,ReceivedComplete)'''
+        for buffer in self.stream_buffer(NbFrames,fillArray):
+            yield buffer.copy()
 
+    def stream_buffer(self,NbFrames=int(100000),fillArray=0):
+        '''same as yield_buffer, but yields numpy views (frames x channels) directly on the ctypes 
+        buffer without boxing the values into python floats. The buffer is reused by the next read, 
+        a consumer has to copy what it keeps before advancing the generator'''
         self.GINSDll._CD_eGateHighSpeedPort_GetDeviceInfo(self.HCONNECTION.value,self.ChannelCount,0,self.info,None)
         ChannelNb=int(self.info.value)
         valuesPtr=(c_double*(NbFrames*ChannelNb))()
+        values=np.ctypeslib.as_array(valuesPtr)
         ReceivedFrames=c_int(0)#pointer
         ReceivedChannels=c_int(0)#pointer
         ReceivedComplete=c_int(0)#pointer
@@ -340,9 +347,8 @@ class ConnectGIns():
         while(ret==0):
             ret=self.GINSDll._CD_eGateHighSpeedPort_ReadBufferToDoubleArray(self.HCONNECTION.value,valuesPtr,(NbFrames*ChannelNb),fillArray,ReceivedFrames,ReceivedChannels,ReceivedComplete)
             chcnt=ReceivedChannels.value
-            BUF=valuesPtr[0:chcnt*ReceivedFrames.value]
-            buffer=np.reshape(BUF,(ReceivedFrames.value,chcnt))
-            yield buffer
+            frames=ReceivedFrames.value
+            yield values[0:chcnt*frames].reshape(frames,chcnt)
 
 
     def close_connection(self):
@@ -387,28 +393,34 @@ def read_again_buffer(buffer):
     return (new_buffer_values)
 
 
-def read_gins_dat(connection):   
+def read_gins_dat(connection, on_chunk=None):   
     '''function calles to read dat file and ensure than all frames are readed. 
     Indeed the number of frames is not known in the header of udbf file, a check 
-    of the timestampl is done in this loop''' 
-    #Call function to store buffer into the variable buffer
-    buffer=connection.yield_buffer()
-    #We read the dat file and save it into the variable disp
-    readbuffer=next(buffer) 
-    Logged_file = readbuffer[:,:]        
-    #This function is needed for reading the full dat file with several buffer frames    
-    while True:
-        #print('we enter while')
-        new_disp=read_again_buffer(buffer)
-        try:
-            new_time=new_disp[0,0]
-        except:
+    of the timestampl is done in this loop. 
+    The chunks are copied once out of the reused ctypes buffer and concatenated at the end, 
+    which keeps the assembly linear in the number of frames. 
+    on_chunk(chunk) is called with every accepted chunk (read only view) while decoding, 
+    e.g. to accumulate statistics''' 
+    chunks=[]
+    last_time=None
+    width=0
+    for buffer in connection.stream_buffer():
+        width=buffer.shape[1]
+        if buffer.shape[0]==0:
             break
-        last_time=Logged_file[-1,0]
-        if new_time>last_time:
-            Logged_file=np.vstack((Logged_file,new_disp))
-        else:
+        #This check is needed for reading the full dat file with several buffer frames    
+        if last_time is not None and not buffer[0,0]>last_time:
             break
+        chunk=buffer.copy()
+        chunk.flags.writeable=False
+        chunks.append(chunk)
+        last_time=chunk[-1,0]
+        if on_chunk is not None:
+            on_chunk(chunk)
+    if not chunks:
+        return np.empty((0,width))
+    Logged_file=chunks[0] if len(chunks)==1 else np.concatenate(chunks,axis=0)
+    Logged_file.flags.writeable=True
     print ('dat file was read')
     return Logged_file
 	
@@ -1,4 +1,3 @@
-from dataclasses import dataclass
 from datetime import datetime
 import logging
 import os
@@ -11,9 +10,12 @@ from typing import Optional
 import time
 
 import redis
+from watchdog.observers.api import BaseObserver
 from watchdog.observers.polling import PollingObserver
 
 from helper.utility import extract_ts
+from .file_index import FileIndex, is_network_fs
+from .ordered_commit import CommitSequencer
 from .watcher import Watcher
 
 
@@ -23,19 +25,35 @@ BASIC_REDIS_TTL = int(os.getenv("BASIC_REDIS_TTL", "60"))
 CONV_CONTEXT = os.getenv("CONV_CONTEXT")
 STABLE_CHECKS = int(os.getenv("STABLE_CHECKS", "2")) # consecutive identical stat() results   
 MIN_FILE_AGE_SEC = float(os.getenv("MIN_FILE_AGE_SEC", "40.0")) # min seconds since last mtime
-TICKER_INTERVAL_SEC = float(os.getenv("TICKER_INTERVAL_SEC", "2.0"))  # periodic rescan
+TICKER_INTERVAL_SEC = float(os.getenv("TICKER_INTERVAL_SEC", "2.0"))  # periodic stability check of the pending head
+RESCAN_INTERVAL_SEC = float(os.getenv("RESCAN_INTERVAL_SEC", "60.0"))  # full directory resync against missed events
+POLL_INTERVAL_SEC = float(os.getenv("POLL_INTERVAL_SEC", "5.0"))  # snapshot interval of the PollingObserver
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "auto")  # auto | inotify | polling
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))  # files processed concurrently per pipeline
 
-@dataclass
-class _StatInfo:
-    size: int
-    mtime: float
-    stable_count: int
+def _make_observer(input_dir: Path) -> BaseObserver:
+    """
+    Pick the watchdog observer for a directory. inotify does not see writes of remote hosts
+    on CIFS/NFS mounts, so 'auto' only uses it on local filesystems and falls back to polling.
+    """
+    backend = WATCH_BACKEND
+    if backend == "auto":
+        backend = "polling" if is_network_fs(input_dir) else "inotify"
+    if backend == "inotify":
+        try:
+            from watchdog.observers.inotify import InotifyObserver
+            return InotifyObserver()
+        except Exception:
+            logger.warning(f"inotify not available for {input_dir}, falling back to polling.")
+    return PollingObserver(timeout=POLL_INTERVAL_SEC)
 
 class Pipeline:
     """
     Monitors a specified folder and starts the processing pipeline.
     Files are enqueued only when they are considered 'stable' (size & mtime
     unchanged for STABLE_CHECKS polls and older than MIN_FILE_AGE_SEC).
+    Up to 'workers' files are processed at once, their side effects (Redis publish,
+    health keys, move to finished/failed) are committed in enqueue (= timestamp) order.
     """
     def __init__(self, 
         name: str, 
@@ -46,6 +64,7 @@ class Pipeline:
         datetime_fmt: str, 
         redis_db: redis.Redis,
         stats_dir: Optional[str] = None, 
+        workers: int = PIPELINE_WORKERS,
     ):
         self.name = name
         self.input = Path(input_dir)
@@ -56,23 +75,33 @@ class Pipeline:
         self.timestamp_re = timestamp_re
         self.datetime_fmt = datetime_fmt
         self.redis_db = redis_db
+        self.workers = max(1, workers)
 
-        self.queue: Queue[Path] = Queue()
+        self.queue: Queue[tuple[int, Path]] = Queue()
+        self.sequencer = CommitSequencer()
         self.lock = threading.Lock()
-        self.processed: set[Path] = set() 
-        self._seen: dict[Path, _StatInfo] = {}  
-
-        t = threading.Thread(target=self.worker, daemon=True, name=f"worker:{self.name}")
-        t.start()
-
-        observer = PollingObserver()
-        handler = Watcher(self.enqueue, self.schedule_next, str(self.input))
+        self._active = 0
+        self.index = FileIndex(
+            input_dir=self.input,
+            ts_fn=self._ts,
+            stable_checks=STABLE_CHECKS,
+            min_file_age_sec=MIN_FILE_AGE_SEC,
+            rescan_interval_sec=RESCAN_INTERVAL_SEC,
+        )
+
+        for i in range(self.workers):
+            t = threading.Thread(target=self.worker, daemon=True, name=f"worker:{self.name}:{i}")
+            t.start()
+
+        observer = _make_observer(self.input)
+        handler = Watcher(self.index, self.schedule_next, str(self.input))
         observer.schedule(handler, self.input, recursive=False)
         observer.start()
         self.observer = observer
         self.handler = handler  
 
         threading.Thread(target=self._ticker, daemon=True, name=f"ticker:{self.name}").start()
+        self.index.rescan()
         self.schedule_next(None)
 
     def _ticker(self) -> None:
@@ -83,41 +112,6 @@ class Pipeline:
             except Exception:
                 logger.exception(f"Ticker scan failed: {self.name}")
 
-    def _stat(self, p: Path) -> os.stat_result | None:
-        try:
-            return p.stat()
-        except FileNotFoundError:
-            self._seen.pop(p, None)
-            return None
-        except Exception:
-            logger.exception(f"{self.name} stat() failed for {p}")
-            return None
-
-    def _is_stable(self, p: Path) -> bool:
-        st = self._stat(p)
-        if not st:
-            return False
-
-        now = time.time()
-        # must be older than MIN_FILE_AGE_SEC
-        if (now - st.st_mtime) < MIN_FILE_AGE_SEC:
-            # reset the seen info (only consecutive identical stats)
-            prev = self._seen.get(p)
-            if prev is None or prev.size != st.st_size or prev.mtime != st.st_mtime:
-                self._seen[p] = _StatInfo(size=st.st_size, mtime=st.st_mtime, stable_count=1)
-            else:
-                prev.stable_count += 1
-            return False
-
-        prev = self._seen.get(p)
-        if prev and prev.size == st.st_size and prev.mtime == st.st_mtime:
-            prev.stable_count += 1
-        else:
-            self._seen[p] = _StatInfo(size=st.st_size, mtime=st.st_mtime, stable_count=1)
-
-        info = self._seen[p]
-        return info.stable_count >= STABLE_CHECKS
-
     def _ts(self, path: Path) -> datetime | None:
         try:
             return extract_ts(path, self.timestamp_re, self.datetime_fmt)
@@ -125,43 +119,38 @@ class Pipeline:
             logger.warning("Skipping file with unparsable timestamp: %s", path)
             return None
 
-    def enqueue(self, path: Path | str) -> None:
+    def enqueue(self, path: Path | str) -> bool:
+        """Claim and queue a file, the caller holds a reserved worker slot (see schedule_next)."""
         p = Path(path)
         with self.lock:
-            if p not in self.processed:
-                self.processed.add(p)
-                self.queue.put(p)
+            if not self.index.claim(p):
+                return False
+            # ticket and queue position are taken together, so commit order == processing order
+            self.queue.put((self.sequencer.issue(), p))
+            return True
 
     def schedule_next(self, _) -> None:
         """
-        Scan the input dir, find the oldest *stable* file not processed and enqueue it. 
-        Runs on FS events and a periodic ticker.
+        Take the oldest *stable* files not processed from the index and enqueue them,
+        until every worker has a file. Runs on FS events and a periodic ticker.
+        A worker slot is reserved under the lock before the index is asked, so concurrent
+        callers (watcher, ticker, worker tails) never enqueue more than 'workers' files.
         """
-        try:
-            dats = [p for p in self.input.iterdir() if p.is_file()]
-        except FileNotFoundError:
-            return
-        
-        candidates: list[tuple[datetime, Path]] = []
-        for p in dats:
-            if p in self.processed:
-                continue
-
-            ts = self._ts(p)
-            if ts is None:
-                continue
-
-            if self._is_stable(p):
-                candidates.append((ts, p))
-        if not candidates:
-            return
-
-        _, oldest = min(candidates)  # oldest timestamp first
-        self.enqueue(oldest)
+        while True:
+            with self.lock:
+                if self._active >= self.workers:
+                    return
+                self._active += 1
+            oldest = self.index.next_stable()
+            if oldest is None or not self.enqueue(oldest):
+                with self.lock:
+                    self._active -= 1
+                return
 
     def worker(self) -> None:
         while True:
-            file_path: Path = self.queue.get()
+            ticket, file_path = self.queue.get()
+            turn = self.sequencer.turn(ticket)
             remove_from_processed = False  # don't requeue infinitely if move fails
             try:
                 logger.info(f"[{self.name}] processing {file_path}")
@@ -171,41 +160,48 @@ class Pipeline:
                         file_path = file_path,
                         stats_dir = self.stats,
                         finished_dir = self.finished,
-                        redis_db = self.redis_db
+                        redis_db = self.redis_db,
+                        commit_turn = turn
                     )
                 elif CONV_CONTEXT == "SENS":
                     from .sens_file_analysis import main as sens_file_analysis
                     sens_file_analysis(
                         file_path = file_path,
                         finished_dir = self.finished,
-                        redis_db = self.redis_db
+                        redis_db = self.redis_db,
+                        commit_turn = turn
                     )
                 elif CONV_CONTEXT == "MIST":
                     from .mist_file_analysis import main as mist_file_analysis
                     mist_file_analysis(
                         file_path = file_path,
                         finished_dir = self.finished,
-                        redis_db = self.redis_db
+                        redis_db = self.redis_db,
+                        commit_turn = turn
                     )
                 else:
                     logger.error("Unknown CONV_CONTEXT=%r for %s", self.name, CONV_CONTEXT, file_path)
 
                 remove_from_processed = True
-                self.redis_db.set(f"health:{self.name}_file_processing", 0, ex=BASIC_REDIS_TTL) 
+                with turn:
+                    self.redis_db.set(f"health:{self.name}_file_processing", 0, ex=BASIC_REDIS_TTL) 
             except Exception:
                 logger.exception(f"[{self.name}] failed on {file_path}, moving to failed dir.")
                 dest = self.failed / file_path.name
                 try:
-                    shutil.move(str(file_path), str(dest))
-                    logger.info(f"Moved bad file to {dest}.")
-                    self.redis_db.set(f"health:{self.name}_file_processing", 1, ex=BASIC_REDIS_TTL) 
+                    with turn:
+                        shutil.move(str(file_path), str(dest))
+                        logger.info(f"Moved bad file to {dest}.")
+                        self.redis_db.set(f"health:{self.name}_file_processing", 1, ex=BASIC_REDIS_TTL) 
                     remove_from_processed = True
                 except Exception:
                     logger.exception(f"Could not move {file_path} to failed dir.")
             finally:
+                turn.close()
+                if remove_from_processed:
+                    self.index.release(file_path)
                 with self.lock:
-                    if remove_from_processed:
-                        self.processed.discard(file_path)
+                    self._active -= 1
 
                 self.queue.task_done()
                 try:
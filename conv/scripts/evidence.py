@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import threading
+import time
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+ALARM_DIR = os.getenv("ALARM_DIR", "")  # evidence bundles of alarmed files, empty disables
+EVIDENCE_STREAMS = [s.strip() for s in os.getenv("EVIDENCE_STREAMS", "lpi_100hz,lpi_1hz").split(",") if s.strip()]
+EVIDENCE_DEADLINE_SEC = float(os.getenv("EVIDENCE_DEADLINE_SEC", "240"))
+EVIDENCE_RECHECK_SEC = float(os.getenv("EVIDENCE_RECHECK_SEC", "30"))  # files of other containers (Allsat) are checked at this interval
+EVIDENCE_COPY_WORKERS = int(os.getenv("EVIDENCE_COPY_WORKERS", "2"))
+INTERNAL_ALLSAT_FINISHED = os.getenv("INTERNAL_ALLSAT_FINISHED", "")  # empty: no Allsat file in the bundles
+TIMEZONE = os.getenv("TIMEZONE", "Europe/Berlin")
+
+TS_RE = re.compile(r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})")
+ALLSAT = "allsat"
+
+def allsat_path(key: str, allsat_dir: str = INTERNAL_ALLSAT_FINISHED) -> Optional[Path]:
+    """
+    Allsat CSV belonging to a file timestamp. The Allsat timestamp is local time (TIMEZONE)
+    and marks the end of the 10 minute measurement, the .dat timestamp is UTC and marks its start.
+    """
+    if not allsat_dir:
+        return None
+    ts_utc = datetime.strptime(key, "%Y-%m-%d_%H-%M-%S").replace(tzinfo=timezone.utc)
+    ts_local = (ts_utc + timedelta(minutes=10)).astimezone(ZoneInfo(TIMEZONE))
+    return Path(allsat_dir) / f"FHEB_{ts_local:%Y_%m_%d_%H_%M_%S}.csv"
+
+@dataclass
+class _Bundle:
+    key: str
+    target: Path
+    deadline: float
+    waiting: set[str]
+    allsat: Optional[Path] = None
+    delivered: list[str] = field(default_factory=list)
+
+class EvidenceBundler:
+    """
+    Collects the evidence of an alarmed file (the files of all streams with the same timestamp,
+    their statistics and the Allsat CSV) into <alarm_dir>/<file stem>.
+    Pipelines report every finished file, an alarm opens a bundle that completes as the matching
+    files are reported, or at the deadline with whatever arrived. Nobody waits on a file:
+    copies run on a small executor, one thread handles the deadlines and the Allsat checks.
+    """
+    def __init__(self,
+        alarm_dir: str | Path,
+        streams: list[str] = EVIDENCE_STREAMS,
+        deadline_sec: float = EVIDENCE_DEADLINE_SEC,
+        recheck_sec: float = EVIDENCE_RECHECK_SEC,
+        allsat_dir: str = INTERNAL_ALLSAT_FINISHED,
+        copy_workers: int = EVIDENCE_COPY_WORKERS,
+    ) -> None:
+        self.alarm_dir = Path(alarm_dir)
+        self.streams = streams
+        self.deadline_sec = deadline_sec
+        self.recheck_sec = recheck_sec
+        self.allsat_dir = allsat_dir
+        self._pending: dict[str, _Bundle] = {}
+        self._recent: dict[str, dict[str, tuple[Path, Optional[pd.DataFrame], float]]] = {}
+        self._deadlines: list[tuple[float, str]] = []
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, copy_workers), thread_name_prefix="evidence")
+        threading.Thread(target=self._deadline_loop, daemon=True, name="evidence:deadlines").start()
+
+    def file_done(self, stream: str, path: Path, df_stats: Optional[pd.DataFrame] = None, alarmed: bool = False) -> None:
+        """
+        Report a processed file (already in its finished dir). Opens a bundle if the file is alarmed.
+
+        Args:
+            stream: Pipeline stream, e.g. 'lpi_1hz'.
+            path: Final path of the .dat file.
+            df_stats: Statistics of the file, written as <stem>_stats.csv into a bundle.
+            alarmed: The file raised an alarm.
+        """
+        m = TS_RE.search(path.name)
+        if not m:
+            return
+        key = m.group(1)
+        now = time.monotonic()
+        with self._cond:
+            self._recent.setdefault(key, {})[stream] = (path, df_stats, now)
+            bundle = self._pending.get(key)
+            if bundle is None and alarmed:
+                bundle = self._open(key, path, now)
+                for s, (p, df, _) in self._recent[key].items():
+                    self._deliver(bundle, s, p, df)
+                self._check_allsat(bundle)
+            elif bundle is not None:
+                self._deliver(bundle, stream, path, df_stats)
+            if bundle is not None and not bundle.waiting:
+                self._finish(bundle, timed_out=False)
+
+    def _open(self, key: str, path: Path, now: float) -> _Bundle:
+        waiting = set(self.streams)
+        apath = allsat_path(key, self.allsat_dir)
+        if apath is not None:
+            waiting.add(ALLSAT)
+        bundle = _Bundle(key=key, target=self.alarm_dir / path.stem, deadline=now + self.deadline_sec, waiting=waiting, allsat=apath)
+        self._pending[key] = bundle
+        heapq.heappush(self._deadlines, (bundle.deadline, key))
+        self._cond.notify()
+        logger.info(f"Alarm evidence bundle opened for {key} in {bundle.target}.")
+        return bundle
+
+    def _deliver(self, bundle: _Bundle, stream: str, path: Path, df_stats: Optional[pd.DataFrame]) -> None:
+        if stream not in bundle.waiting:
+            return
+        bundle.waiting.discard(stream)
+        bundle.delivered.append(stream)
+        self._executor.submit(self._copy, bundle.target, path, df_stats)
+
+    def _check_allsat(self, bundle: _Bundle) -> None:
+        if ALLSAT in bundle.waiting and bundle.allsat is not None and bundle.allsat.exists():
+            self._deliver(bundle, ALLSAT, bundle.allsat, None)
+
+    def _finish(self, bundle: _Bundle, timed_out: bool) -> None:
+        self._pending.pop(bundle.key, None)
+        if timed_out:
+            logger.warning(f"Alarm evidence bundle {bundle.target} closed at deadline, missing: {sorted(bundle.waiting)}.")
+        else:
+            logger.info(f"Alarm evidence bundle {bundle.target} complete: {bundle.delivered}.")
+
+    @staticmethod
+    def _copy(target: Path, path: Path, df_stats: Optional[pd.DataFrame]) -> None:
+        try:
+            target.mkdir(parents=True, exist_ok=True)
+            dest = target / path.name
+            try:
+                os.link(path, dest)  # same filesystem: no data copied
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copy2(path, dest)
+            if df_stats is not None:
+                df_stats.to_csv(target / f"{path.stem}_stats.csv", index=False)
+        except Exception:
+            logger.exception(f"Failed to copy evidence {path} to {target}.")
+
+    def _deadline_loop(self) -> None:
+        while True:
+            with self._cond:
+                timeout = self.recheck_sec
+                if self._deadlines:
+                    timeout = min(timeout, max(0.0, self._deadlines[0][0] - time.monotonic()))
+                self._cond.wait(timeout=timeout)
+
+                now = time.monotonic()
+                for bundle in list(self._pending.values()):
+                    self._check_allsat(bundle)
+                    if not bundle.waiting:
+                        self._finish(bundle, timed_out=False)
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, key = heapq.heappop(self._deadlines)
+                    bundle = self._pending.get(key)
+                    if bundle is not None:
+                        self._finish(bundle, timed_out=True)
+                for key in [k for k, v in self._recent.items() if all(now - t > self.deadline_sec for _, _, t in v.values())]:
+                    del self._recent[key]
+
+_bundler: Optional[EvidenceBundler] = None
+_bundler_lock = threading.Lock()
+
+def get_evidence_bundler() -> Optional[EvidenceBundler]:
+    """Process-wide bundler shared by all pipelines, None if ALARM_DIR is not set."""
+    global _bundler
+    if not ALARM_DIR:
+        return None
+    with _bundler_lock:
+        if _bundler is None:
+            _bundler = EvidenceBundler(ALARM_DIR)
+        return _bundler
@@ -0,0 +1,233 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+import heapq
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "fuse.sshfs"}
+
+@dataclass
+class _Entry:
+    ts: datetime
+    seq: int
+    size: int = -1
+    mtime: float = -1.0
+    stable_count: int = 0
+    last_event: float = field(default_factory=time.time)
+
+def is_network_fs(path: Path) -> bool:
+    """
+    Check whether a path lives on a network mount (CIFS/NFS), where inotify does not see remote writes.
+
+    Args:
+        path: Directory to check.
+
+    Returns:
+        bool: True if the longest matching mount point in /proc/mounts is a network filesystem.
+    """
+    try:
+        target = str(path.resolve())
+        best, best_type = "", ""
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if (target == mount_point or target.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best):
+                    best, best_type = mount_point, parts[2]
+        return best_type in NETWORK_FS_TYPES
+    except OSError:
+        return False
+
+class FileIndex:
+    """
+    Incremental index of the pending files of one input directory.
+    Filesystem events only update the index (O(1) per event), the timestamp parsed from the
+    filename is cached per file and pending files are kept in a heap ordered by that timestamp.
+    Only the oldest few entries are stat()ed when looking for the next stable file, so a tick
+    costs O(changes) instead of O(directory size). A slow full rescan repairs missed events.
+    """
+    def __init__(self,
+        input_dir: Path,
+        ts_fn: Callable[[Path], Optional[datetime]],
+        stable_checks: int,
+        min_file_age_sec: float,
+        rescan_interval_sec: float = 60.0,
+        max_probes: int = 8,
+    ):
+        self.input = input_dir
+        self.ts_fn = ts_fn
+        self.stable_checks = stable_checks
+        self.min_file_age_sec = min_file_age_sec
+        self.rescan_interval_sec = rescan_interval_sec
+        self.max_probes = max_probes
+
+        self.lock = threading.Lock()
+        self._entries: dict[Path, _Entry] = {}
+        self._heap: list[tuple[datetime, int, Path]] = []
+        self._claimed: set[Path] = set()
+        self._unparsable: set[Path] = set()
+        self._seq = 0
+        self._last_rescan = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def in_flight(self) -> int:
+        """Number of claimed files not yet released."""
+        return len(self._claimed)
+
+    def add(self, path: Path | str) -> None:
+        """Register a created/moved-in file. Existing entries are treated like a modification."""
+        p = Path(path)
+        with self.lock:
+            self._add_locked(p)
+
+    def touch(self, path: Path | str) -> None:
+        """
+        Record a modification event. Only resets the stability counter and remembers the event time,
+        so modify storms of a file that is still being written never trigger stat() calls.
+        """
+        p = Path(path)
+        with self.lock:
+            entry = self._entries.get(p)
+            if entry is None:
+                self._add_locked(p)
+                return
+            entry.stable_count = 0
+            entry.last_event = time.time()
+
+    def discard(self, path: Path | str) -> None:
+        """Forget a deleted or moved-away file. Its heap item is dropped lazily."""
+        p = Path(path)
+        with self.lock:
+            self._entries.pop(p, None)
+            self._unparsable.discard(p)
+
+    def claim(self, path: Path | str) -> bool:
+        """
+        Take a file out of the pending set for processing.
+
+        Returns:
+            bool: False if the file is already claimed.
+        """
+        p = Path(path)
+        with self.lock:
+            if p in self._claimed:
+                return False
+            self._claimed.add(p)
+            self._entries.pop(p, None)
+            return True
+
+    def release(self, path: Path | str) -> None:
+        """Evict a processed file from the index, so a file with the same name can be picked up again."""
+        p = Path(path)
+        with self.lock:
+            self._claimed.discard(p)
+
+    def rescan(self) -> None:
+        """
+        Diff a full directory listing against the index. Uses os.scandir so no stat() per file is needed.
+        """
+        try:
+            with os.scandir(self.input) as it:
+                names = {Path(e.path) for e in it if e.is_file()}
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self._last_rescan = time.time()
+            for p in list(self._entries):
+                if p not in names:
+                    del self._entries[p]
+            self._unparsable &= names
+            for p in names:
+                if p not in self._entries:
+                    self._add_locked(p, reset=False)
+
+    def next_stable(self) -> Optional[Path]:
+        """
+        Find the oldest stable pending file. Looks at no more than max_probes entries of the heap head.
+
+        Returns:
+            Path | None: Oldest stable file, None if no candidate is stable yet.
+        """
+        if time.time() - self._last_rescan >= self.rescan_interval_sec:
+            self.rescan()
+
+        with self.lock:
+            now = time.time()
+            probed: list[tuple[datetime, int, Path]] = []
+            found: Optional[Path] = None
+            try:
+                while self._heap and len(probed) < self.max_probes:
+                    item = heapq.heappop(self._heap)
+                    _, seq, p = item
+                    entry = self._entries.get(p)
+                    if entry is None or entry.seq != seq:
+                        continue  # stale heap item
+                    probed.append(item)
+                    if self._is_stable(p, entry, now):
+                        found = p
+                        break
+            finally:
+                for item in probed:
+                    heapq.heappush(self._heap, item)
+                self._compact_locked()
+            return found
+
+    def _add_locked(self, p: Path, reset: bool = True) -> None:
+        if p in self._claimed or p in self._unparsable:
+            return
+        entry = self._entries.get(p)
+        if entry is not None:
+            if reset:
+                entry.stable_count = 0
+                entry.last_event = time.time()
+            return
+        ts = self.ts_fn(p)
+        if ts is None:
+            self._unparsable.add(p)
+            return
+        self._seq += 1
+        entry = _Entry(ts=ts, seq=self._seq)
+        if not reset:
+            entry.last_event = 0.0  # found by rescan, there is no event telling us it is still written
+        self._entries[p] = entry
+        heapq.heappush(self._heap, (ts, entry.seq, p))
+
+    def _is_stable(self, p: Path, entry: _Entry, now: float) -> bool:
+        # Debounce: a recent event already tells us the file is too young, no need to stat().
+        if (now - entry.last_event) < self.min_file_age_sec:
+            return False
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            self._entries.pop(p, None)
+            return False
+        except Exception:
+            logger.exception(f"stat() failed for {p}")
+            return False
+
+        if entry.size == st.st_size and entry.mtime == st.st_mtime:
+            entry.stable_count += 1
+        else:
+            entry.size, entry.mtime, entry.stable_count = st.st_size, st.st_mtime, 1
+
+        # must be older than min_file_age_sec
+        if (now - st.st_mtime) < self.min_file_age_sec:
+            return False
+        return entry.stable_count >= self.stable_checks
+
+    def _compact_locked(self) -> None:
+        # Drop stale heap items once they dominate the heap.
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e.ts, e.seq, p) for p, e in self._entries.items()]
+            heapq.heapify(self._heap)
@@ -1,3 +1,4 @@
+from contextlib import AbstractContextManager, nullcontext
 import logging
 from pathlib import Path
 
@@ -28,8 +29,9 @@ def file_analysis(file_path: Path): ...
 
 def redis_push(redis_db: redis.Redis): ...
 
-def main(file_path: Path, finished_dir: Path, redis_db: redis.Redis):
+def main(file_path: Path, finished_dir: Path, redis_db: redis.Redis, commit_turn: AbstractContextManager = nullcontext()):
     check_readability(file_path)
     file_analysis(file_path)
-    redis_push(redis_db)
-    move_to_finished(file_path, finished_dir)
\ No newline at end of file
+    with commit_turn:
+        redis_push(redis_db)
+        move_to_finished(file_path, finished_dir)
\ No newline at end of file
@@ -0,0 +1,64 @@
+import threading
+from types import TracebackType
+from typing import Optional
+
+
+class CommitSequencer:
+    """
+    Hands out increasing tickets in enqueue order and lets the side effects of the
+    tickets run strictly in that order, while the work before them runs concurrently.
+    """
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def issue(self) -> int:
+        """Reserve the next position in the commit order."""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            return ticket
+
+    def turn(self, ticket: int) -> "CommitTurn":
+        return CommitTurn(self, ticket)
+
+    def _wait(self, ticket: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._serving == ticket)
+
+    def _advance(self, ticket: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._serving == ticket)
+            self._serving += 1
+            self._cond.notify_all()
+
+class CommitTurn:
+    """
+    Context manager guarding the ordered side effects of one ticket.
+    Entering blocks until all older tickets are closed, it can be entered several times.
+    close() must always be called once, it releases the turn to the next ticket.
+    """
+    def __init__(self, sequencer: CommitSequencer, ticket: int) -> None:
+        self.sequencer = sequencer
+        self.ticket = ticket
+        self._held = False
+        self._closed = False
+
+    def __enter__(self) -> "CommitTurn":
+        if not self._held:
+            self.sequencer._wait(self.ticket)
+            self._held = True
+        return self
+
+    def __exit__(self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        return None
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.sequencer._advance(self.ticket)
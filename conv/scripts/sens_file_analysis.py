@@ -1,3 +1,4 @@
+from contextlib import AbstractContextManager, nullcontext
 import logging
 from pathlib import Path
 from typing import Dict, Tuple, Optional
@@ -6,6 +7,7 @@ import pandas as pd
 import redis
 
 from helper.processing import move_to_finished
+from helper.redis_utility import announce_publish
 
 logger = logging.getLogger(__name__)
 
@@ -97,14 +99,16 @@ def redis_push(redis_db: redis.Redis, redis_key: str, mapping: Dict[str, str], T
     pipe = redis_db.pipeline(transaction=True)
     pipe.hset(redis_key, mapping=mapping)
     pipe.expire(redis_key, TTL)
+    announce_publish(pipe, redis_key)
     pipe.execute()
     logger.info(f"Pushed {len(mapping)} fields to Redis key '{redis_key}'.")
 
 
-def main(file_path: Path, finished_dir: Path, redis_db: redis.Redis):
+def main(file_path: Path, finished_dir: Path, redis_db: redis.Redis, commit_turn: AbstractContextManager = nullcontext()):
     if not check_readability(file_path):
         raise RuntimeError(f"Readability check failed for {file_path}")
 
     redis_key, mapping = file_analysis(file_path)
-    redis_push(redis_db, redis_key, mapping)
-    move_to_finished(file_path, finished_dir)
+    with commit_turn:
+        redis_push(redis_db, redis_key, mapping)
+        move_to_finished(file_path, finished_dir)
@@ -1,30 +1,51 @@
-import csv
-from datetime import datetime, timezone, timedelta
+from contextlib import AbstractContextManager, nullcontext
 import logging
 import os
 from pathlib import Path
-import re
-import shutil
-import time
-from zoneinfo import ZoneInfo
 
+import numpy as np
 import redis
 
+from gantner_operations.channel_selection import EXPORT_FULL_CHANNELS, selected_channels
 from gantner_operations.DataConverterUDBF import DataConverterUDBF
+from gantner_operations.pyramid import get_pyramid
+from gantner_operations.rolling import get_rolling_stats
+from gantner_operations.rollups import get_rollup_store
+from gantner_operations.stage_graph import Stage, StageGraph
+from gantner_operations.stats_dataset import file_batch, get_stats_dataset, window_batch
+from helper.redis_utility import announce_publish
+
+from .evidence import get_evidence_bundler
 
 
 logger = logging.getLogger(__name__)
 
 BASIC_REDIS_TTL = int(os.getenv("BASIC_REDIS_TTL", "60"))
 BASIC_ROUNDING = int(os.getenv("BASIC_ROUNDING", "3"))
+WINDOW_SEC = float(os.getenv("WINDOW_SEC", "1.0"))  # sub-file statistics window, rows go to stats_dir/window_dataset, 0 disables
+STATS_OUTPUT = os.getenv("STATS_OUTPUT", "dataset")  # dataset | csv | both, csv writes one _stats.csv per file
+ROLLUP_DIR = os.getenv("ROLLUP_DIR", "/app/state")  # local (not network share) dir of the roll-up databases, empty disables
+STATS_WAL_DIR = os.getenv("STATS_WAL_DIR", "/app/state")  # local dir of the stats dataset WALs, empty keeps them next to the parts
+LIVE_STATS = os.getenv("LIVE_STATS", "1") == "1"  # rolling window stats in 'live:<stream>', checkpointed to ROLLUP_DIR
+LIVE_REDIS_TTL = int(os.getenv("LIVE_REDIS_TTL", "600"))
+ROLLING_CHECKPOINT_SEC = float(os.getenv("ROLLING_CHECKPOINT_SEC", "300"))
+ALARM_REDIS_TTL = int(os.getenv("ALARM_REDIS_TTL", "600"))
+PYRAMID_DIR = os.getenv("PYRAMID_DIR", "")  # root of the min/max envelope pyramids, empty disables
+EXPORT_FORMATS = [f.strip().lower() for f in os.getenv("EXPORT_FORMATS", "").split(",") if f.strip()]  # mat, parquet
 
 HEALTH_LPI_100HZ_FILE_SIZE = os.getenv("HEALTH_LPI_100HZ_FILE_SIZE", "health:lpi_100hz_file_size")
 HEALTH_LPI_1HZ_FILE_SIZE = os.getenv("HEALTH_LPI_1HZ_FILE_SIZE", "health:lpi_1hz_file_size")
 
-def udbf_file_analysis(file_path: Path, stats_dir: Path, finished_dir: Path, redis_db: redis.Redis) -> None:
+def udbf_file_analysis(
+    file_path: Path,
+    stats_dir: Path,
+    finished_dir: Path,
+    redis_db: redis.Redis,
+    commit_turn: AbstractContextManager = nullcontext(),
+) -> None:
     """
     Main processing flow for recognized DAT files.
-    Current: Read files, create a CSV with statistical values, write data to redis, move the file to finished dir. Failed files are moved on Pipeline level.
+    Current: Read files, run the analysis stages (see _analysis_graph), store statistical values (stats dataset and/or CSV, see STATS_OUTPUT), write data to redis, move the file to finished dir. Failed files are moved on Pipeline level.
 
     Args:
         file_path: Path object to the currently to be processed file.
@@ -32,6 +53,7 @@ def udbf_file_analysis(file_path: Path, stats_dir: Path, finished_dir: Path, red
         stats_dir: General path to the directory statistics files.
         finished_dir: General path to the directory processed files.    
         redis_db: Redis databank to save values to.    
+        commit_turn: Entered before the side effects (health keys, Redis publish, move), keeps them in file order when several workers run.
     """
 
     # Sanity checks
@@ -50,10 +72,136 @@ def udbf_file_analysis(file_path: Path, stats_dir: Path, finished_dir: Path, red
         str(raw_file),              # original filename
         str(path_dir),              # input directory
         str(file_path),             # full path
-        BASIC_ROUNDING
+        BASIC_ROUNDING,
+        channels=selected_channels(),  # None: all channels
     )
 
     health_file_size = conv.check_filesize()
+
+    run = _analysis_graph(conv, raw_file, stats_dir, finished_dir).run(raw_file)
+    buckets = run.value("envelope")
+    windows = run.value("windows")
+    moments = run.value("moments")
+    # Arrow tables of the stats rows are built here, the commit turn only logs and buffers them
+    stats_rows = None
+    if STATS_OUTPUT in ("dataset", "both") and conv.stats_channels:
+        try:
+            stats_rows = file_batch(_file_time_ns(conv), raw_file, conv.stats_channels, {**conv.stats, **conv.spectral})
+        except Exception:
+            logger.exception(f"Failed to build the stats rows of {raw_file}")
+
+    with commit_turn:
+        # Edges depend on the previous file of the stream, so they are resolved in file order
+        try:
+            conv.resolve_alarms(_stream(raw_file))
+        except Exception:
+            logger.exception(f"Failed to evaluate alarm rules for {raw_file}")
+        if stats_rows is not None:
+            try:
+                get_stats_dataset(stats_dir / "dataset", STATS_WAL_DIR or None).append(stats_rows)
+            except Exception:
+                logger.exception(f"Failed to write statistics to the dataset for {raw_file}")
+        # Window rows go into their own day partitioned dataset instead of one file per .dat
+        if windows is not None and windows.table.num_rows:
+            try:
+                get_stats_dataset(stats_dir / "window_dataset", STATS_WAL_DIR or None).append(windows)
+            except Exception:
+                logger.exception(f"Failed to write window statistics for {raw_file}")
+        if moments is not None:
+            try:
+                stream = _stream(raw_file)
+                store = get_rollup_store(Path(ROLLUP_DIR) / f"rollups_{stream}.sqlite")
+                touched = store.add_file(raw_file, _file_time_ns(conv), conv.stats_channels, moments)
+                store.publish(redis_db, stream, touched)
+            except Exception:
+                logger.exception(f"Failed to update roll-ups for {raw_file}")
+            if LIVE_STATS:
+                try:
+                    _publish_live(redis_db, _stream(raw_file), _file_time_ns(conv), conv.stats_channels, moments)
+                except Exception:
+                    logger.exception(f"Failed to update live statistics for {raw_file}")
+        # Appended in file order, so the pyramid files only grow at the end
+        if buckets:
+            try:
+                get_pyramid(Path(PYRAMID_DIR) / _stream(raw_file)).append(conv.channel_names[1:], buckets)
+            except Exception:
+                logger.exception(f"Failed to update envelope pyramid for {raw_file}")
+        _commit(conv, raw_file, health_file_size, finished_dir, redis_db)
+
+def _analysis_graph(conv: DataConverterUDBF, raw_file: str, stats_dir: Path, finished_dir: Path) -> StageGraph:
+    """
+    Analysis stages of a file. The file is decoded once by the first stage needing 'data', all
+    stages share that matrix, the time axis and the layout. Statistics and the stats CSV are required,
+    a failure of any other stage is logged and only skips the stages depending on it.
+    """
+    def decode() -> np.ndarray:
+        conv.read_udbf_file()
+        conv.data.flags.writeable = False  # shared by concurrent stages
+        return conv.data
+
+    stages = [
+        Stage("stats", lambda data: conv.compute_statistics(), ("data",), required=True),
+        Stage("spectral", lambda stats: conv.compute_spectral(), ("stats",)),
+        Stage("alarms", lambda data, layout: conv.evaluate_alarms(), ("data", "layout")),
+    ]
+    if STATS_OUTPUT in ("csv", "both"):
+        stages.append(Stage("stats_csv", lambda stats: conv.save_statistics_csv(str(stats_dir)), ("stats",), required=True))
+    if WINDOW_SEC > 0:
+        stages.append(Stage("windows", lambda data, time_axis: window_batch(raw_file, conv.compute_window_statistics(WINDOW_SEC)), ("data", "time_axis")))
+    # Exports are written next to the .dat in the finished dir
+    if "parquet" in EXPORT_FORMATS:
+        stages.append(Stage("export_parquet", lambda data, time_axis: conv.save_as_parquet(str(finished_dir), full=EXPORT_FULL_CHANNELS), ("data", "time_axis")))
+    if "mat" in EXPORT_FORMATS:
+        stages.append(Stage("export_mat", lambda data, time_axis: conv.save_as_mat(str(finished_dir), full=EXPORT_FULL_CHANNELS), ("data", "time_axis")))
+    if PYRAMID_DIR:
+        stages.append(Stage("envelope", lambda time_axis: conv.envelope_buckets(), ("time_axis",)))
+    if ROLLUP_DIR:
+        stages.append(Stage("moments", lambda stats: conv.compute_moments() if conv.stats_channels else None, ("stats",)))
+
+    graph = StageGraph(stages, {
+        "data": decode,
+        "time_axis": lambda: (graph.resource("data"), conv.time_axis)[1],
+        "layout": lambda: (graph.resource("data"), conv.layout)[1],
+    })
+    return graph
+
+def _publish_live(redis_db: redis.Redis, stream: str, t_ns: int, channels: list[str], moments: dict) -> None:
+    """Slide the rolling windows of a stream and replace 'live:<stream>' with the new snapshot."""
+    engine = get_rolling_stats(Path(ROLLUP_DIR) / f"rolling_{stream}.npz")
+    engine.push(t_ns, channels, moments)
+    fields = engine.snapshot()
+    if fields:
+        key = f"live:{stream}"
+        pipe = redis_db.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, LIVE_REDIS_TTL)
+        announce_publish(pipe, key)
+        pipe.execute()
+    engine.checkpoint(min_interval_sec=ROLLING_CHECKPOINT_SEC)
+
+def _file_time_ns(conv: DataConverterUDBF) -> int:
+    """Time of the first sample, ns since epoch."""
+    return int(conv.time_axis[0].astype("datetime64[ns]").astype(np.int64))
+
+def _stream(raw_file: str) -> str:
+    """Logger stream of a file, 'lpi_100hz' or 'lpi_1hz' like the health keys."""
+    if "100hz" in raw_file.lower():
+        return "lpi_100hz"
+    elif "1hz" in raw_file.lower():
+        return "lpi_1hz"
+    return "lpi"
+
+def _commit(
+    conv: DataConverterUDBF,
+    raw_file: str,
+    health_file_size: int,
+    finished_dir: Path,
+    redis_db: redis.Redis,
+) -> None:
+    """
+    Side effects of a processed file, run in file order: health key, stats publish, move to finished, alarm evidence.
+    """
     if "100hz" in raw_file.lower():
         redis_db.set(HEALTH_LPI_100HZ_FILE_SIZE, health_file_size, ex=BASIC_REDIS_TTL)
     elif "1hz" in raw_file.lower():
@@ -61,25 +209,24 @@ def udbf_file_analysis(file_path: Path, stats_dir: Path, finished_dir: Path, red
     else:
         pass
 
-    conv.read_udbf_file()
-    conv.date_converter()
-    conv.save_statistics_csv(str(stats_dir))
-    
     # Publish stats to redis hash
     key = f"stats:{raw_file.replace('.dat','')}"
-    mapping: dict[str,str] = {}
+    mapping: dict[str,float] = {}
     try:
-        for _, row in conv.df_stats.iterrows():
-            sensor = row["Sensor"]
-            mapping.update({
-                f"{sensor}:mean"   : row["Mean"],
-                f"{sensor}:min"    : row["Minimum"],
-                f"{sensor}:max"    : row["Maximum"]
-            })
+        mapping = conv.stats_mapping()
         if mapping:
             pipe = redis_db.pipeline()
             pipe.hset(key, mapping=mapping)
             pipe.expire(key, BASIC_REDIS_TTL)
+            announce_publish(pipe, key)
+            if conv.alarms is not None:
+                # Active alarms of the stream, in the same round trip as the stats
+                alarm_key = f"alarm:{_stream(raw_file)}"
+                active = {f: v for f, v in conv.alarms.fields(conv.time_axis.astype("datetime64[ns]").astype(np.int64)).items() if f.endswith("_ts")}
+                pipe.delete(alarm_key)
+                if active:
+                    pipe.hset(alarm_key, mapping={**active, "file": raw_file})
+                    pipe.expire(alarm_key, ALARM_REDIS_TTL)
             pipe.execute()
         else:
             logger.warning(f"No stats to publish for {raw_file!r}, skipping.")
@@ -91,66 +238,8 @@ def udbf_file_analysis(file_path: Path, stats_dir: Path, finished_dir: Path, red
     conv.move_to_finished(str(finished_dir))
 
 
-    """ OLD CODE SNIPPET FOR ALARMED LOGIC, TO SPECIFIC TO BE FACOTORIZED, ADJUST AS NEEDED    
-    # Alarmed logic
-    if stats_dir.stem.endswith("stats"):
-        base = file_path.stem 
-
-        for idx, name in enumerate(conv.channel_names):
-            if (name.endswith("_GAL") or name.endswith("_RAL")) and conv.data[:, idx].max() == 1:
-                target = ALARM_DIR / base
-                target.mkdir(parents=True, exist_ok=True)
-
-                # Copy 1Hz .dat file + its stats CSV
-                src_dat1 = Path(file_path)
-                src_csv1 = Path(stats_dir) / f"{base}_stats.csv"
-                shutil.copy(src_dat1,  target / src_dat1.name)
-                if src_csv1.exists():
-                    shutil.copy(src_csv1, target / src_csv1.name)
-
-                # Locate the matching 100 Hz paths
-                finished_100hz = Path(os.getenv("FINISHED_DIR_100HZ", "/app/files/finished_100hz"))
-                stats100hz = Path(os.getenv("STATS_DIR_100HZ", "/app/files/stats_100hz"))
-                dat100 = finished_100hz / f"{base}.dat"
-                csv100 = stats100hz / f"{base}_stats.csv"
-
-                # Wait up to 30 s for the .dat to arrive
-                waited = 0
-                while waited < 30 and not dat100.exists():
-                    time.sleep(1)
-                    waited += 1
-                if dat100.exists():
-                    shutil.copy(dat100, target / dat100.name)
-
-                # Then wait up to 180 s for the stats .csv
-                while waited < 240 and not csv100.exists():
-                    time.sleep(2)
-                    waited += 2
-                if csv100.exists():
-                    shutil.copy(csv100, target / csv100.name)
-
-                # Compute & copy the Allsat file
-                # Allsat Timestamp is in German Timezone, .dat file is in UTC
-                # Allsat Timestamp indicates end of measurement, .dat file timestamp indicates start of measurement
-                m = ALLSAT_PATTERN.search(base)
-                if m:
-                    ts_utc = datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S").replace(tzinfo=timezone.utc)
-                else:
-                    # Fallback to mtime if name isn't in the expected format
-                    ts_utc = datetime.fromtimestamp(Path(file_path).stat().st_mtime, tz=timezone.utc)
-                ts_end_utc = ts_utc + timedelta(minutes=10)
-                ts_berlin = ts_end_utc.astimezone(ZoneInfo(TIMEZONE))
-                allsat_name = f"FHEB_{ts_berlin:%Y_%m_%d_%H_%M_%S}.csv"
-                allsat_path = INTERNAL_ALLSAT_FINISHED / allsat_name
-
-                waited = 0
-                while waited < 240 and not allsat_path.exists():
-                    time.sleep(2)
-                    waited += 2
-
-                if allsat_path.exists():
-                    shutil.copy(allsat_path, target / allsat_path.name)
-
-                break"""
-
-
+    bundler = get_evidence_bundler()
+    if bundler is not None:
+        # Never waits: an alarm opens a bundle, the files of the other streams complete it when they finish
+        alarmed = conv.alarms is not None and bool(conv.alarms.active.any())
+        bundler.file_done(_stream(raw_file), finished_dir / raw_file, conv.df_stats, alarmed=alarmed)
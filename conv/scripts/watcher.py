@@ -1,7 +1,10 @@
 import logging
+from pathlib import Path
 from typing import Callable
 
-from watchdog.events import FileSystemEventHandler, FileMovedEvent, FileCreatedEvent, FileSystemEvent
+from watchdog.events import FileSystemEventHandler, FileMovedEvent, FileCreatedEvent, FileDeletedEvent, FileSystemEvent
+
+from .file_index import FileIndex
 
 
 logger = logging.getLogger(__name__)
@@ -9,26 +12,38 @@ logger = logging.getLogger(__name__)
 class Watcher(FileSystemEventHandler):
     """
     Watchdog to react when a file appears in the input folder.
-    'schedule_next' looks at *all* files and enqueue only the oldest if >1 exist.
+    Events only update the FileIndex, 'schedule_next' then picks the oldest stable file from it.
     """
-    def __init__(self, enqueue_fn: Callable[[str], None], schedule_next_fn: Callable[[str], None], input_dir: str) -> None:
+    def __init__(self, index: FileIndex, schedule_next_fn: Callable[[str], None], input_dir: str) -> None:
         super().__init__()
-        self.enqueue = enqueue_fn
+        self.index = index
         self.schedule_next = schedule_next_fn
         self.input_dir = input_dir
+        self._input = Path(input_dir).resolve()
+
+    def _in_input(self, path: str) -> bool:
+        return Path(path).resolve().parent == self._input
 
     def on_created(self, event: FileSystemEvent) -> None:
         if isinstance(event, FileCreatedEvent) and not event.is_directory:
             logger.debug(f"Detected created: {event.src_path}")
+            self.index.add(event.src_path)
             self.schedule_next(self.input_dir)
 
     def on_moved(self, event: FileSystemEvent) -> None:
         if isinstance(event, FileMovedEvent) and not event.is_directory:
             logger.debug(f"Detected moved: {event.dest_path}")
+            self.index.discard(event.src_path)
+            if self._in_input(event.dest_path):
+                self.index.add(event.dest_path)
             self.schedule_next(self.input_dir)
 
+    def on_deleted(self, event: FileSystemEvent) -> None:
+        if isinstance(event, FileDeletedEvent) and not event.is_directory:
+            self.index.discard(event.src_path)
+
     def on_modified(self, event: FileSystemEvent) -> None:
         if not event.is_directory:
             # Commenting it out for spam reasons -> .dat files get constantly modified in the folder.
             # logger.debug(f"Detected modified: {event.src_path}")
-            self.schedule_next(self.input_dir)
\ No newline at end of file
+            self.index.touch(event.src_path)
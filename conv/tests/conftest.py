@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The services run from conv/ and import gantner_operations / scripts from there
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from gantner_operations.alarms import AlarmEngine, AlarmRule, compile_rules, conditions, evaluate
+
+
+def _engine(edge: str, debounce_sec: float) -> AlarmEngine:
+    return AlarmEngine([AlarmRule("high", ("A_*",), ">=", 1.0, edge, debounce_sec)])
+
+def _run_files(engine: AlarmEngine, files: list[np.ndarray], sample_rate: float) -> list:
+    compiled = engine.compiled(["Timestamp", "A_1", "A_2"])
+    return [engine.resolve("lpi_1hz", conditions(compiled, f, sample_rate)) for f in files]
+
+def test_rising_debounced_condition_held_across_files_fires_once():
+    engine = _engine("rising", 2.0)
+    files = [np.ones((10, 2)), np.ones((10, 2)), np.ones((10, 2))]
+    results = _run_files(engine, files, sample_rate=1.0)
+    assert results[0].active.tolist() == [True, True]
+    assert results[0].first_index.tolist() == [1, 1]
+    for r in results[1:]:
+        assert not r.active.any()
+        assert r.first_index.tolist() == [-1, -1]
+
+def test_falling_debounced_condition_held_across_files_does_not_fire():
+    engine = _engine("falling", 2.0)
+    results = _run_files(engine, [np.ones((10, 2))] * 3, sample_rate=1.0)
+    assert not any(r.active.any() for r in results)
+
+def test_debounce_window_spanning_a_file_boundary():
+    engine = _engine("level", 3.0)
+    a = np.zeros((10, 2))
+    a[-2:] = 1.0  # two samples at the end of the first file, not yet debounced
+    b = np.ones((5, 2))
+    first, second = _run_files(engine, [a, b], sample_rate=1.0)
+    assert not first.active.any()
+    assert second.first_index.tolist() == [0, 0]
+    assert second.triggers.tolist() == [5, 5]
+
+@pytest.mark.parametrize("edge", ["level", "rising", "falling"])
+@pytest.mark.parametrize("debounce_sec", [0.0, 1.0, 4.0, 25.0])
+def test_split_files_match_one_evaluation(edge, debounce_sec):
+    rng = np.random.default_rng(7)
+    signal = (rng.random((120, 2)) < 0.8).astype(np.float64)
+    signal[40:70] = 1.0
+    engine = _engine(edge, debounce_sec)
+    compiled = engine.compiled(["Timestamp", "A_1", "A_2"])
+    whole = evaluate(compiled, signal, 1.0)
+
+    bounds = [0, 3, 17, 17, 50, 52, 90, 120]  # includes an empty and very short files
+    results = _run_files(engine, [signal[a:b] for a, b in zip(bounds[:-1], bounds[1:])], sample_rate=1.0)
+    triggers = sum(r.triggers for r in results)
+    firsts = [np.where(r.active, r.first_index + a, -1) for r, a in zip(results, bounds)]
+    first = np.array([min((f[i] for f in firsts if f[i] >= 0), default=-1) for i in range(2)])
+    assert triggers.tolist() == whole.triggers.tolist()
+    assert first.tolist() == whole.first_index.tolist()
+    assert results[-1].last.tolist() == whole.last.tolist()
+    assert results[-1].run.tolist() == whole.run.tolist()
@@ -0,0 +1,49 @@
+import numpy as np
+
+from gantner_operations.statistics import QC_FLATLINE, QC_SATURATED, channel_statistics, qc_excluded, qc_thresholds
+
+
+def test_status_channels_are_excluded():
+    names = ["Tuerschalter", "TUERSCHALTER", "Netz_Ausfall", "NETZAUSFALL", "USV_Betrieb", "USV_BETRIEB",
+             "Blitzüberwachung", "BLITZUEBERWACHUNG", "Batterieüberwachung", "BATTRIEUEBERWACHUNG",
+             "LIFECYCLE_QSTATION", "X_GAL", "X_RAL"]
+    assert qc_excluded(names).all()
+    assert not qc_excluded(["BS_T1_L3_O_INC_X", "T_T1_L2_ON_O"]).any()
+
+def test_constant_and_toggling_status_channels_are_not_flagged():
+    n = 30 * 100  # one 30 s file at 100 Hz
+    constant = np.ones(n)
+    toggling = np.zeros(n)
+    toggling[n // 3:2 * n // 3] = 1.0
+    stats = channel_statistics(np.column_stack([constant, toggling]), sample_rate=100.0)
+    qc = stats["qc"].astype(int)
+    # The constant one is a flatline like a dead analog sensor, so it relies on the exclusion
+    assert qc[0] & QC_FLATLINE
+    assert qc_excluded(["USV_Betrieb", "Tuerschalter"]).all()
+    # A 0/1 signal has no sample between its rails, it is not saturated even if not excluded
+    assert not qc[1] & QC_SATURATED
+
+def test_flatline_threshold_per_channel():
+    n = 30  # one 30 s file at 1 Hz
+    temperature = np.full(n, 21.5)
+    strain = np.full(n, 0.25)
+    names = ["T_T1_L2_ON_O", "BS_T1_L3_O_SIG_X"]
+    stats = channel_statistics(np.column_stack([temperature, strain]), sample_rate=1.0, thresholds=qc_thresholds(names, 1.0))
+    qc = stats["qc"].astype(int)
+    assert not qc[0] & QC_FLATLINE
+    assert qc[1] & QC_FLATLINE
+
+def test_short_flat_run_is_not_a_flatline():
+    x = np.repeat(np.arange(3.0), 10)  # 10 s steps at 1 Hz
+    assert not int(channel_statistics(x[:, None], sample_rate=1.0)["qc"][0]) & QC_FLATLINE
+
+def test_stream_rules_by_sample_rate():
+    rules = [{"pattern": "A*", "sample_rate": 1, "flatline_sec": 600}]
+    assert qc_thresholds(["A1", "B1"], 1.0, rules)["flatline_sec"].tolist()[0] == 600
+    assert qc_thresholds(["A1"], 100.0, rules)["flatline_sec"].tolist() == qc_thresholds(["A1"], 100.0, [])["flatline_sec"].tolist()
+
+def test_saturated_analog_channel_is_flagged():
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=3000)
+    x = np.clip(x, -1.0, 1.0)  # ~30 % of the samples on the rails
+    assert int(channel_statistics(x[:, None], sample_rate=100.0)["qc"][0]) & QC_SATURATED
@@ -1,4 +1,5 @@
 import logging
+import os
 import time
 import threading
 
@@ -7,6 +8,20 @@ import redis
 
 logger = logging.getLogger(__name__)
 
+STATS_STREAM = os.getenv("STATS_STREAM", "events:stats")  # one entry per published stats:*/live:* key, read by the Modbus writer
+STATS_STREAM_MAXLEN = int(os.getenv("STATS_STREAM_MAXLEN", "10000"))  # capped, trimmed approximately on every XADD
+
+def announce_publish(pipe: redis.client.Pipeline, key: str) -> None:
+    """
+    Append the published key to STATS_STREAM, queued on the pipeline that writes the key so
+    both land in the same round trip.
+
+    Args:
+        pipe: Pipeline that also writes the key.
+        key: Published Redis key.
+    """
+    pipe.xadd(STATS_STREAM, {"key": key}, maxlen=STATS_STREAM_MAXLEN, approximate=True)
+
 def start_heartbeat(redis_client: redis.Redis, key: str, interval: int = 60, ttl: int = 180) -> threading.Thread:
     """
     Starts thread, every 'interval' seconds write key with 'ttl' expiry into redis.
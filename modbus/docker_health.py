@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+
+logger = logging.getLogger("modbus")
+
+DOCKER_URL = os.getenv("DOCKER_URL", "unix:///var/run/docker.sock")
+DOCKER_TIMEOUT_SEC = float(os.getenv("DOCKER_TIMEOUT_SEC", "3"))
+DOCKER_POLL_SEC = float(os.getenv("DOCKER_POLL_SEC", "15"))  # one container list per interval
+DOCKER_STATE_TTL_SEC = float(os.getenv("DOCKER_STATE_TTL_SEC", "60"))  # older states are not reported
+COMPOSE_PROJECT = os.getenv("COMPOSE_PROJECT_NAME", "")  # empty: all compose services of the host
+
+SERVICE_LABEL = "com.docker.compose.service"
+PROJECT_LABEL = "com.docker.compose.project"
+
+def container_state(container: dict) -> str:
+    """
+    Health of a container of the /containers/json list, as a key of DEFAULT_MAP / MODBUS_MAP.
+    The docker healthcheck result if the container has one, otherwise healthy while running.
+    """
+    status = container.get("Status", "")
+    if "(health: starting)" in status:
+        return "starting"
+    if "(unhealthy)" in status:
+        return "unhealthy"
+    if "(healthy)" in status:
+        return "healthy"
+    return "healthy" if container.get("State") == "running" else "unhealthy"
+
+class DockerHealthCollector:
+    """
+    Lists the compose containers with one API call every 'interval' seconds in its own thread and
+    caches their health per service. Readers only see the cache, so a slow or hung Docker daemon
+    never blocks them, its states just age out after 'ttl' seconds.
+    """
+    def __init__(
+        self,
+        base_url: str = DOCKER_URL,
+        project: str = COMPOSE_PROJECT,
+        interval: float = DOCKER_POLL_SEC,
+        ttl: float = DOCKER_STATE_TTL_SEC,
+        timeout: float = DOCKER_TIMEOUT_SEC,
+    ) -> None:
+        self.base_url = base_url
+        self.project = project
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self._client = None
+        self._states: dict[str, tuple[str, float]] = {}  # service -> (state, monotonic time)
+        self.prev: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _api(self):
+        # Created in the collector thread, the client asks the daemon for its API version on creation.
+        if self._client is None:
+            import docker
+            self._client = docker.APIClient(base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    def poll(self) -> dict[str, str]:
+        """
+        List the containers once and update the cache.
+
+        Returns:
+            dict: Service -> state of this poll.
+        """
+        label = f"{PROJECT_LABEL}={self.project}" if self.project else SERVICE_LABEL
+        containers = self._api().containers(all=True, filters={"label": label})
+        now = time.monotonic()
+        states: dict[str, str] = {}
+        for c in containers:
+            service = (c.get("Labels") or {}).get(SERVICE_LABEL)
+            if not service:
+                continue
+            state = container_state(c)
+            # Scaled or recreated services have several containers, the worst one counts
+            if states.get(service) not in ("unhealthy", "starting") or state == "unhealthy":
+                states[service] = state
+        with self._lock:
+            self._states.update((service, (state, now)) for service, state in states.items())
+        for service, state in states.items():
+            if self.prev.get(service) != state:
+                logger.info(f"Container {service} is {state} (was {self.prev.get(service, 'unknown')}).")
+        self.prev.update(states)
+        return states
+
+    def states(self) -> dict[str, str]:
+        """Cached state per service, only states younger than the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            return {service: state for service, (state, t) in self._states.items() if now - t <= self.ttl}
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"Docker container list from {self.base_url} failed: {e}")
+                self._client = None  # reconnect on the next poll
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - t0)))
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="docker_health")
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from docker_health import DockerHealthCollector
+from register_plan import RegisterImage, RegisterPlan
+
+
+logger = logging.getLogger("modbus")
+
+# Health states as the pipelines write them (0 = healthy) and as the PLC expects them (1 = healthy)
+DEFAULT_MAP = {
+    "starting": -1,
+    "healthy":   0,
+    "unhealthy": 1
+}
+MODBUS_MAP = {
+    "starting": -1,
+    "healthy":   1,
+    "unhealthy": 0
+}
+_DEFAULT_STATES = {v: k for k, v in DEFAULT_MAP.items()}
+
+HEARTBEAT_PREFIX = "health:container_"  # heartbeat keys hold "1" while the container is alive, suffix is the compose service
+
+def health_state(key: str, val: Optional[str]) -> str:
+    """
+    State of a health key. A missing key has expired, so its writer stopped: unhealthy.
+
+    Args:
+        key: Health key.
+        val: Its value, None if missing.
+
+    Returns:
+        str: Key of DEFAULT_MAP / MODBUS_MAP.
+    """
+    if val is None:
+        return "unhealthy"
+    if key.startswith(HEARTBEAT_PREFIX):
+        return "healthy" if val.strip() == "1" else "unhealthy"
+    try:
+        return _DEFAULT_STATES.get(int(float(val)), "unhealthy")
+    except ValueError:
+        logger.warning(f"Cannot parse {val!r} of health key '{key}'.")
+        return "unhealthy"
+
+class HealthCollector:
+    """
+    Polls all health:* keys of the register plan with a single MGET every 'interval' seconds and
+    writes them in the MODBUS_MAP convention into the register image. Only changed registers are flushed.
+    With 'containers', the cached Docker state of a service replaces its heartbeat key while it is fresh.
+    """
+    def __init__(
+        self,
+        redis_db: redis.Redis,
+        plan: RegisterPlan,
+        image: RegisterImage,
+        server,
+        interval: float = 10.0,
+        containers: Optional[DockerHealthCollector] = None,
+    ) -> None:
+        self.redis_db = redis_db
+        self.plan = plan.subset(f for f in plan.fields if f.startswith("health:"))
+        self.image = image
+        self.server = server
+        self.interval = interval
+        self.containers = containers
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> int:
+        """
+        Fetch and write the health keys once.
+
+        Returns:
+            int: Number of registers that changed.
+        """
+        if not self.plan.fields:
+            return 0
+        values = self.redis_db.mget(self.plan.fields)
+        services = self.containers.states() if self.containers is not None else {}
+        changed = 0
+        for key, registers, val in zip(self.plan.fields, self.plan.registers, values):
+            service = key[len(HEARTBEAT_PREFIX):] if key.startswith(HEARTBEAT_PREFIX) else None
+            state = services[service] if service in services else health_state(key, val)
+            for register in registers:
+                changed += self.image.set(register, float(MODBUS_MAP[state]))
+        if changed:
+            self.image.flush(self.server)
+            logger.debug(f"Health registers changed: {changed}.")
+        return changed
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Failed to collect health keys.")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - t0)))
+
+    def start(self) -> threading.Thread:
+        logger.debug(f"Collecting {len(self.plan.fields)} health keys every {self.interval}s.")
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="health_collector")
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import struct
+import threading
+from typing import Optional
+
+
+logger = logging.getLogger("modbus")
+
+READ_HOLDING_REGISTERS = 3
+READ_FUNCTIONS = (1, 2, 3, 4)  # only holding registers are served, the others answer Illegal Data Address like an empty datastore
+MAX_REGISTERS = 125  # per read request, Modbus limit
+
+def _error(header: bytes, function_code: int, exception_code: int) -> bytes:
+    transaction_id, protocol, _, unit_id = struct.unpack("!HHHB", header)
+    return struct.pack("!HHHBBB", transaction_id, protocol, 3, unit_id, function_code | 0x80, exception_code)
+
+class SnapshotServer:
+    """
+    Asyncio Modbus TCP server (function code 3) serving the holding registers from an immutable
+    snapshot of the register image. publish swaps in a new snapshot as one reference assignment,
+    every request reads from the snapshot that was current when it arrived, so clients never see
+    a half written batch and the writer never waits for a reader.
+    Runs its event loop in a background thread, publish may be called from any thread.
+    """
+    def __init__(self, host: str = "0.0.0.0", port: int = 502) -> None:
+        self.host = host
+        self.port = port
+        self._words = b""  # big endian 16 bit registers from address 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def publish(self, words: bytes) -> None:
+        """Replace the served registers with an immutable copy of 'words'."""
+        self._words = bytes(words)
+
+    def respond(self, header: bytes, pdu: bytes) -> bytes:
+        """Response frame of one request, header is the MBAP header (7 bytes), pdu the rest."""
+        function_code = pdu[0] if pdu else 0
+        if function_code not in READ_FUNCTIONS or len(pdu) != 5:
+            return _error(header, function_code, 1)  # Illegal Function
+        first, count = struct.unpack("!HH", pdu[1:5])
+        if not 1 <= count <= MAX_REGISTERS:
+            return _error(header, function_code, 3)  # Illegal Data Value
+        words = self._words  # one snapshot per request
+        if function_code != READ_HOLDING_REGISTERS or (first + count) * 2 > len(words):
+            return _error(header, function_code, 2)  # Illegal Data Address
+        data = words[first * 2:(first + count) * 2]
+        transaction_id, protocol, _, unit_id = struct.unpack("!HHHB", header)
+        return struct.pack("!HHHBBB", transaction_id, protocol, 3 + len(data), unit_id, function_code, len(data)) + data
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                length = struct.unpack("!H", header[4:6])[0]
+                if not 2 <= length <= 254:
+                    logger.warning(f"Invalid Modbus frame length {length} from {peer}, closing.")
+                    break
+                pdu = await reader.readexactly(length - 1)
+                writer.write(self.respond(header, pdu))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, reuse_address=True)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> None:
+        """Start the event loop thread, raises if the port cannot be bound."""
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True, name="modbus_tcp").start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        logger.info(f"Modbus TCP server listening on {self.host}:{self.port}")
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
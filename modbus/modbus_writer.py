@@ -4,15 +4,19 @@ import os
 import time
 import threading
 
-import docker
 import modbus_server
 import redis
 
+from docker_health import DockerHealthCollector
+from health_collector import HealthCollector
+from modbus_tcp import SnapshotServer
+from register_plan import FLOAT_REGISTERS, RegisterImage, RegisterPlan
 
 from logger.setup_logging import setup_logging
 
 MODBUS_HOST = os.getenv("MODBUS_HOST", "0.0.0.0")
 MODBUS_PORT = int(os.getenv("MODBUS_PORT", 502))
+MODBUS_SERVER = os.getenv("MODBUS_SERVER", "snapshot")  # snapshot (asyncio, see modbus_tcp) | legacy (modbus_server package)
 
 MY_CONVERTER = os.getenv("MODBUS_SERVICE_CONVERTER", "converter")
 MY_REDIS = os.getenv("MODBUS_SERVICE_REDIS", "redis")
@@ -23,16 +27,15 @@ MY_COMBINER = os.getenv("MODBUS_SERVICE_COMBINER", "combiner")
 MY_FETCHER = os.getenv("MODBUS_SERVICE_FETCHER", "fetcher")
 HEALTH_KEY_ALLSAT = os.getenv("HEALTH_KEY_ALLSAT", "health:allsat_fetch")
 HEALTH_UDBF_FILE_SIZE = os.getenv("HEALTH_UDBF_FILE_SIZE", "health:udbf_file_size")
+STATS_STREAM = os.getenv("STATS_STREAM", "events:stats")  # the converters XADD every published stats:*/live:* key
+STREAM_BLOCK_MS = int(os.getenv("MODBUS_STREAM_BLOCK_MS", "5000"))  # max wait of one XREAD
+STREAM_BATCH = int(os.getenv("MODBUS_STREAM_BATCH", "500"))  # events per XREAD
+SCAN_COUNT = int(os.getenv("MODBUS_SCAN_COUNT", "1000"))  # keys per SCAN round trip of the startup sync
+HEALTH_POLL_SEC = float(os.getenv("MODBUS_HEALTH_POLL_SEC", "10"))  # cadence of the health:* MGET
+REG_HEARTBEAT = int(os.getenv("MODBUS_HEARTBEAT_REGISTER", "128"))  # next to the health block 100-126, must not be mapped
 
 logger = logging.getLogger("modbus")
 
-# Healthcheck steup
-docker_client = docker.DockerClient(
-    base_url='unix:///var/run/docker.sock',
-    timeout=3
-)
-prev = {}
-
 def main():
     setup_logging(process_name="modbus")
 
@@ -43,87 +46,84 @@ def main():
         decode_responses=True
     )
 
-    # Mapping for the healthchecks
-    default_map = {
-            "starting": -1,
-            "healthy":   0,
-            "unhealthy": 1
-        }
-    modbus_map = {
-            "starting": -1,
-            "healthy":   1,
-            "unhealthy": 0
-        }
-    
     mapping_path = os.getenv("MAPPING_PATH", "setup/mapping.json")
     logger.debug(f"Loading mapping from {mapping_path}.")
     with open(mapping_path) as f:
         MAPPINGS = json.load(f)
 
+    plan = RegisterPlan(MAPPINGS)
+    image = RegisterImage(max(plan.highest, REG_HEARTBEAT + FLOAT_REGISTERS - 1) + 1)  # also covers the heartbeat
+    stats_plan = plan.subset(f for f in plan.fields if not f.startswith("health:"))  # health keys are plain string keys, see HealthCollector
+    logger.debug(f"Compiled {len(plan.fields)} fields into {len(plan.ranges)} register runs.")
+    # Floats span two registers, the heartbeat must not share one with a mapped field
+    overlap = [f for f, regs in zip(plan.fields, plan.registers) if any(abs(r - REG_HEARTBEAT) < 2 for r in regs)]
+    if overlap:
+        raise ValueError(f"Heartbeat register {REG_HEARTBEAT} overlaps {overlap} of {mapping_path}, set MODBUS_HEARTBEAT_REGISTER.")
+
     try:
-        server = modbus_server.Server(host=MODBUS_HOST, port=MODBUS_PORT)
+        if MODBUS_SERVER == "legacy":
+            server = modbus_server.Server(host=MODBUS_HOST, port=MODBUS_PORT)
+        else:
+            server = SnapshotServer(host=MODBUS_HOST, port=MODBUS_PORT)
         server.start()
         logger.debug(f"Modbus server started on {MODBUS_HOST}:{MODBUS_PORT}")
-        highest_register = max(entry["register"] for entry in MAPPINGS) + 1  # +1 to cover float (2 registers)
-        for addr in range(0, highest_register + 1, 2):  
-            server.set_holding_register(addr, 0.0, "f")
-        logger.debug(f"Prefilled holding registers 0 to {highest_register}.")
+        image.flush(server)
+        logger.debug(f"Prefilled holding registers 0 to {image.size - 1}.")
     except Exception:
         logger.exception(f"Failed to start Modbus server.")
         exit(1)
 
     # Flip Heartbeat
-    REG_HEARTBEAT = 120 
     heartbeat_state = False
 
     def flip_heartbeat():
         nonlocal heartbeat_state
         heartbeat_state = not heartbeat_state
-        server.set_holding_register(REG_HEARTBEAT, float(heartbeat_state), "f")
+        image.set(REG_HEARTBEAT, float(heartbeat_state))
+        image.flush(server)
         logger.info(f"Heartbeat to {int(heartbeat_state)} at register {REG_HEARTBEAT}.")
         t = threading.Timer(10*60, flip_heartbeat)
         t.daemon = True
         t.start()
 
     flip_heartbeat()
-
+    # Container health from the Docker socket, polled in its own thread and only read from its cache
+    containers = DockerHealthCollector()
+    containers.start()
+    HealthCollector(redis_db, plan, image, server, interval=HEALTH_POLL_SEC, containers=containers).start()
 
     # writer loop
-    logger.debug("Starting Redis→Modbus one-shot writer loop...")
+    logger.debug("Starting Redis→Modbus event driven writer loop...")
 
-    processed = set() 
+    def fetch(keys: list[str]) -> list[list]:
+        """One HMGET of all stats fields per key, all keys in one pipelined round trip."""
+        pipe = redis_db.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, stats_plan.fields)
+        return pipe.execute()
+
+    def apply(keys: list[str]) -> None:
+        for key, values in zip(keys, fetch(keys)):
+            logger.debug(f"Using redis key: {key}")
+            image.apply(stats_plan, values, key)
+        image.flush(server)
 
     try:
+        # Remember the stream position first, then take over the keys that are already there.
+        # Keys announced in between are applied twice, which is harmless.
+        last = redis_db.xrevrange(STATS_STREAM, count=1)
+        cursor = last[0][0] if last else "0-0"
+        apply(sorted(redis_db.scan_iter("live:*", count=SCAN_COUNT)) + sorted(redis_db.scan_iter("stats:*", count=SCAN_COUNT)))
+
         while True:
-            did_any = False
-
-            for stats_key in redis_db.scan_iter("stats:*"):
-                if stats_key in processed:
-                    continue  # already consumed
-                
-                logger.debug(f"Using redis key: {stats_key}")
-                for entry in MAPPINGS:
-                    field    = entry["field"]
-                    register = entry["register"]
-
-                    val = redis_db.hget(stats_key, field)
-                    if val is None:
-                        continue
-
-                    try:
-                        float_val = float(val.replace(",", "."))
-                    except ValueError:
-                        logger.warning(f"Cannot parse {val!r} for field '{field}' from {stats_key}.")
-                        continue
-
-                    server.set_holding_register(register, float_val, "f")
-                    # logger.debug(f"Wrote {float_val} from {stats_key}.{field} → HR {register}")
-
-                processed.add(stats_key)
-                did_any = True
-
-            if not did_any:
-                time.sleep(0.3)
+            response = redis_db.xread({STATS_STREAM: cursor}, count=STREAM_BATCH, block=STREAM_BLOCK_MS)
+            if not response:
+                continue
+            _, events = response[0]
+            cursor = events[-1][0]
+            # A key announced several times in the batch is fetched once, at its last position
+            keys = list(reversed(dict.fromkeys(reversed([fields["key"] for _, fields in events if "key" in fields]))))
+            apply(keys)
 
     except Exception:
         logger.exception("Error in modbus writer loop.")
@@ -0,0 +1,131 @@
+import logging
+import struct
+import threading
+from typing import Iterable, Optional
+
+
+logger = logging.getLogger("modbus")
+
+FLOAT_REGISTERS = 2  # float32 "f", big endian like modbus_server packs it
+
+class RegisterPlan:
+    """
+    mapping.json compiled once at startup: the unique fields in a fixed order (the argument list
+    of one HMGET per key), the registers of every field and the contiguous register runs.
+    """
+    def __init__(self, mappings: list[dict]) -> None:
+        registers: dict[str, list[int]] = {}
+        for entry in mappings:
+            registers.setdefault(entry["field"], []).append(int(entry["register"]))
+        self.fields = list(registers)
+        self.registers = [tuple(r) for r in registers.values()]
+        self.highest = max((r for regs in self.registers for r in regs), default=0) + FLOAT_REGISTERS - 1
+        self.ranges = self._ranges(sorted(r for regs in self.registers for r in regs))
+
+    @staticmethod
+    def _ranges(registers: list[int]) -> list[tuple[int, int]]:
+        """(first register, float count) of every run of adjacent floats."""
+        ranges: list[tuple[int, int]] = []
+        for r in registers:
+            if ranges and r == ranges[-1][0] + ranges[-1][1] * FLOAT_REGISTERS:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+            else:
+                ranges.append((r, 1))
+        return ranges
+
+    def subset(self, fields: Iterable[str]) -> "RegisterPlan":
+        """Plan of only the given fields (e.g. the health keys), in the order of this plan."""
+        wanted = set(fields)
+        return RegisterPlan([{"field": f, "register": r} for f, regs in zip(self.fields, self.registers) if f in wanted for r in regs])
+
+def parse_value(val: Optional[str]) -> Optional[float]:
+    """Redis value as float, decimal commas accepted. None if missing, ValueError if not a number."""
+    if val is None:
+        return None
+    return float(val.replace(",", ".")) if isinstance(val, str) else float(val)
+
+class RegisterImage:
+    """
+    Packed float32 image of the holding registers 0..size-1 (two big endian 16 bit words per float).
+    Values are written into the image, flush pushes the registers changed since the last flush
+    to the server in one go. Thread safe, the heartbeat timer writes into the same image.
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size + size % 2
+        self.words = bytearray(self.size * 2)
+        self._dirty: set[int] = set(range(0, self.size, FLOAT_REGISTERS))  # first flush prefills all registers
+        self._lock = threading.Lock()
+
+    def set(self, register: int, value: float) -> bool:
+        """Write one float, True if the registers changed. Registers outside the image are logged and skipped."""
+        if not 0 <= register <= self.size - FLOAT_REGISTERS:
+            logger.error(f"Register {register} is outside the image of {self.size} registers, skipped.")
+            return False
+        packed = struct.pack("!f", value)
+        offset = register * 2
+        with self._lock:
+            if self.words[offset:offset + 4] == packed:
+                return False
+            self.words[offset:offset + 4] = packed
+            self._dirty.add(register)
+            return True
+
+    def apply(self, plan: RegisterPlan, values: list[Optional[str]], source: str = "") -> int:
+        """
+        Write the HMGET/MGET result of plan.fields into the image.
+
+        Args:
+            plan: The plan the values were fetched with.
+            values: One value per plan.fields, None for missing fields.
+            source: Redis key, only for the log.
+
+        Returns:
+            int: Number of floats that changed.
+        """
+        changed = 0
+        for field, registers, val in zip(plan.fields, plan.registers, values):
+            try:
+                value = parse_value(val)
+            except ValueError:
+                logger.warning(f"Cannot parse {val!r} for field '{field}' from {source}.")
+                continue
+            if value is None:
+                continue
+            for register in registers:
+                changed += self.set(register, value)
+        return changed
+
+    def flush(self, server) -> int:
+        """
+        Push the changed registers to the Modbus server. A server with publish (see modbus_tcp)
+        gets an immutable snapshot of the whole image. With the DictDatastore of modbus_server the
+        words go in with a single dict update, otherwise one set_holding_registers call per run.
+
+        Returns:
+            int: Number of floats written.
+        """
+        if hasattr(server, "publish"):
+            with self._lock:
+                # Published under the lock, so a concurrent flush never replaces a newer snapshot by an older one
+                dirty = len(self._dirty)
+                self._dirty.clear()
+                if dirty:
+                    server.publish(self.words)
+            return dirty
+        with self._lock:
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            words = bytes(self.words)
+        if not dirty:
+            return 0
+        store = getattr(getattr(server, "datastore", None), "datadict", None)
+        if store is not None:
+            update = {}
+            for r in dirty:
+                update[r] = words[r * 2:r * 2 + 2]
+                update[r + 1] = words[r * 2 + 2:r * 2 + 4]
+            store["holding_registers"].update(update)
+        else:
+            for start, count in RegisterPlan._ranges(dirty):
+                server.set_holding_registers(start, list(struct.unpack(f"!{count}f", words[start * 2:(start + count * FLOAT_REGISTERS) * 2])), "f")
+        return len(dirty)
@@ -32,11 +32,13 @@ class VerifyFingerprintPolicy(paramiko.MissingHostKeyPolicy):
         # Accept and remember so future connections don't trigger this again
         client._host_keys.add(hostname, key.get_name(), key)
 
-def newest_file(dirpath: Path) -> Optional[Path]:
+UPLOAD_SUFFIX = os.getenv("UPLOAD_SUFFIX", "")  # e.g. ".parquet" to only upload the converted files
+
+def newest_file(dirpath: Path, suffix: str = UPLOAD_SUFFIX) -> Optional[Path]:
     """
-    Find the newst file my mtime in a folder.
+    Find the newst file my mtime in a folder, optionally only files ending with 'suffix'.
     """
-    files = [p for p in dirpath.iterdir() if p.is_file()]
+    files = [p for p in dirpath.iterdir() if p.is_file() and p.name.endswith(suffix)]
     if not files:
         return None
     return max(files, key=lambda p: p.stat().st_mtime)